@@ -1,6 +1,7 @@
 from amaranth import *
 
 from .generic import GenericController
+from ..error_correction import GenericCode
 
 
 class BasicController(GenericController):
@@ -11,44 +12,210 @@ class BasicController(GenericController):
     decoder the data going to and coming from the memory. The rest of this module simply handles the arbitration of
     the request and response ports to make sure no requests are accepted when we are unable to handle them,
     and that all responses are only delivered once.
+
+    By setting `pipeline` a register stage is added after the encoder and after the decoder. This removes the encoder
+    and decoder from the paths to and from the SRAM, at the cost of two extra cycles of latency. The throughput of
+    the controller is unaffected, as a new request can be accepted every cycle.
+
+    By setting `skid_buffer` an extra response buffer is added, which catches a response that is not accepted when
+    the next request is handled. This allows the request ready signal to be driven from a register, instead of being
+    combinationally dependent on the response ready signal, at the cost of one extra data width register.
+
+    By setting `registered_read` the memory output is registered before it is decoded. This register can be mapped
+    onto the output register of the SRAM, and removes the SRAM read path from the decoder input, at the cost of one
+    extra cycle of latency.
     """
+
+    def __init__(self, code: GenericCode, addr_width: int, pipeline: bool = False, skid_buffer: bool = False,
+                 registered_read: bool = False):
+        super().__init__(code, addr_width, registered_read=registered_read)
+        self.pipeline = pipeline
+        self.skid_buffer = skid_buffer
+
     def elaborate(self, platform):
         m = Module()
 
         m.submodules.encoder = encoder = self.code.encoder()
         m.submodules.decoder = decoder = self.code.decoder()
 
+        # Response which is presented next, before the optional skid buffer
+        rsp_valid = Signal()
+        rsp_read_data = Signal(unsigned(self.code.data_bits))
+        rsp_error = Signal()
+        rsp_uncorrectable_error = Signal()
+
+        # High when the response stage is able to receive a new response this cycle
+        advance = Signal()
+        # High when the response is accepted this cycle
+        rsp_fire = Signal()
+
         req_fire = self.req.valid & self.req.ready
-        rsp_fire = self.rsp.valid & self.rsp.ready
 
         m.d.comb += [
             # Connect request
-            self.sram.clk_en.eq(req_fire),
-            self.sram.addr.eq(self.req.addr),
-            self.sram.write_en.eq(self.req.write_en),
             encoder.data_in.eq(self.req.write_data),
-            self.sram.write_data.eq(encoder.enc_out),
-            self.req.ready.eq((self.rsp.valid & self.rsp.ready) | ~self.rsp.valid),
+            self.req.ready.eq(advance),
+        ]
+
+        # Keep track of when the memory output belongs to a request
+        sram_rsp_valid = Signal()
+        sram_rsp_ignore = Signal()
+
+        if self.pipeline:
+            # Register the encoded request before sending it to the memory
+            sram_req_valid = Signal()
+            sram_req_addr = Signal(unsigned(self.addr_width))
+            sram_req_write_en = Signal()
+            sram_req_write_data = Signal(unsigned(self.code.total_bits))
+            sram_req_ignore = Signal()
+            with m.If(advance):
+                m.d.sync += [
+                    sram_req_valid.eq(self.req.valid),
+                    sram_req_addr.eq(self.req.addr),
+                    sram_req_write_en.eq(self.req.write_en),
+                    sram_req_write_data.eq(encoder.enc_out),
+                    sram_req_ignore.eq(self.req.debug_ignore),
+                ]
+
+            m.d.comb += [
+                self.sram.clk_en.eq(sram_req_valid & advance),
+                self.sram.addr.eq(sram_req_addr),
+                self.sram.write_en.eq(sram_req_write_en),
+                self.sram.write_data.eq(sram_req_write_data),
+            ]
+
+            with m.If(advance):
+                m.d.sync += [
+                    sram_rsp_valid.eq(sram_req_valid),
+                    sram_rsp_ignore.eq(sram_req_ignore),
+                ]
+        else:
+            m.d.comb += [
+                # Connect request
+                self.sram.clk_en.eq(req_fire),
+                self.sram.addr.eq(self.req.addr),
+                self.sram.write_en.eq(self.req.write_en),
+                self.sram.write_data.eq(encoder.enc_out),
+            ]
 
+            if self.sram.registered_read:
+                # The memory output moves on to the read data register when the response stage advances
+                with m.If(advance):
+                    m.d.sync += [
+                        sram_rsp_valid.eq(req_fire),
+                        sram_rsp_ignore.eq(self.req.debug_ignore),
+                    ]
+            else:
+                # When a request fires it is accepted, therefore the response should always be valid on the next cycle
+                with m.If(req_fire):
+                    m.d.sync += sram_rsp_valid.eq(1)
+                # If no request fires and the response does fire, the buffered response is consumed and no longer
+                # valid
+                with m.Elif(rsp_fire):
+                    m.d.sync += sram_rsp_valid.eq(0)
+
+                m.d.sync += sram_rsp_ignore.eq(self.req.debug_ignore)
+
+        if self.sram.registered_read:
+            # Register the memory output before decoding it, this register maps onto the output register of the SRAM
+            dec_enc_in = Signal(unsigned(self.code.total_bits))
+            dec_valid = Signal()
+            dec_ignore = Signal()
+            with m.If(advance):
+                m.d.sync += [
+                    dec_enc_in.eq(self.sram.read_data),
+                    dec_valid.eq(sram_rsp_valid),
+                    dec_ignore.eq(sram_rsp_ignore),
+                ]
+
+            m.d.comb += decoder.enc_in.eq(dec_enc_in)
+        else:
+            dec_valid = sram_rsp_valid
+            dec_ignore = sram_rsp_ignore
+
+            m.d.comb += decoder.enc_in.eq(self.sram.read_data)
+
+        if self.pipeline:
+            # Register the decoded response
+            with m.If(advance):
+                m.d.sync += [
+                    rsp_valid.eq(dec_valid),
+                    rsp_read_data.eq(decoder.data_out),
+                    rsp_error.eq(decoder.error),
+                    rsp_uncorrectable_error.eq(decoder.uncorrectable_error),
+                ]
+        else:
             # Connect decoder
-            decoder.enc_in.eq(self.sram.read_data),
-            self.rsp.read_data.eq(decoder.data_out),
-            self.rsp.error.eq(decoder.error),
-            self.rsp.uncorrectable_error.eq(decoder.uncorrectable_error),
-        ]
+            m.d.comb += [
+                rsp_valid.eq(dec_valid),
+                rsp_read_data.eq(decoder.data_out),
+                rsp_error.eq(decoder.error),
+                rsp_uncorrectable_error.eq(decoder.uncorrectable_error),
+            ]
+
+        m.d.comb += self.debug.ignore.eq(dec_ignore)
+
+        if self.pipeline or self.sram.registered_read:
+            # Every time the pipeline advances the current response is replaced
+            rsp_replaced = advance
+        else:
+            # The memory output only changes when a new request is accepted
+            rsp_replaced = req_fire
+
+        if self.skid_buffer:
+            skid_valid = Signal()
+            skid_read_data = Signal(unsigned(self.code.data_bits))
+            skid_error = Signal()
+            skid_uncorrectable_error = Signal()
+
+            # New requests are accepted as long as the skid buffer is empty
+            m.d.comb += [
+                advance.eq(~skid_valid),
+                rsp_fire.eq(rsp_valid & self.rsp.ready & ~skid_valid),
+            ]
+
+            # If the response is about to be replaced before it was accepted, move it into the skid buffer
+            with m.If(rsp_replaced & rsp_valid & ~self.rsp.ready):
+                m.d.sync += [
+                    skid_valid.eq(1),
+                    skid_read_data.eq(rsp_read_data),
+                    skid_error.eq(rsp_error),
+                    skid_uncorrectable_error.eq(rsp_uncorrectable_error),
+                ]
+            # Once the response from the skid buffer is accepted it is no longer valid
+            with m.Elif(self.rsp.ready):
+                m.d.sync += skid_valid.eq(0)
+
+            # The response in the skid buffer is always older than the other response, so it goes first
+            with m.If(skid_valid):
+                m.d.comb += [
+                    self.rsp.valid.eq(1),
+                    self.rsp.read_data.eq(skid_read_data),
+                    self.rsp.error.eq(skid_error),
+                    self.rsp.uncorrectable_error.eq(skid_uncorrectable_error),
+                ]
+            with m.Else():
+                m.d.comb += [
+                    self.rsp.valid.eq(rsp_valid),
+                    self.rsp.read_data.eq(rsp_read_data),
+                    self.rsp.error.eq(rsp_error),
+                    self.rsp.uncorrectable_error.eq(rsp_uncorrectable_error),
+                ]
+        else:
+            m.d.comb += [
+                advance.eq(rsp_fire | ~rsp_valid),
+                rsp_fire.eq(rsp_valid & self.rsp.ready),
 
-        # When a request fires it is accepted, therefore the response should always be valid on the next cycle
-        with m.If(req_fire):
-            m.d.sync += self.rsp.valid.eq(1)
-        # If no request fires and the response does fire, the buffered response is consumed and no longer valid
-        with m.Elif(rsp_fire):
-            m.d.sync += self.rsp.valid.eq(0)
+                self.rsp.valid.eq(rsp_valid),
+                self.rsp.read_data.eq(rsp_read_data),
+                self.rsp.error.eq(rsp_error),
+                self.rsp.uncorrectable_error.eq(rsp_uncorrectable_error),
+            ]
 
         m.d.comb += [
             self.debug.error.eq(decoder.error),
             self.debug.uncorrectable_error.eq(decoder.uncorrectable_error),
             self.debug.flips.eq(decoder.flips),
         ]
-        m.d.sync += self.debug.ignore.eq(self.req.debug_ignore)
 
         return m
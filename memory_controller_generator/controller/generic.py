@@ -1,4 +1,4 @@
-from typing import List
+from typing import Tuple
 
 from amaranth import *
 
@@ -14,7 +14,7 @@ class GenericController(Elaboratable):
     and that the SRAM is connected in the same way.
     """
 
-    def __init__(self, code: GenericCode, addr_width: int):
+    def __init__(self, code: GenericCode, addr_width: int, dual_write: bool = False, registered_read: bool = False):
         self.code = code
         self.addr_width = addr_width
 
@@ -23,10 +23,13 @@ class GenericController(Elaboratable):
         self.rsp = MemoryResponseRecord(code.data_bits)
 
         # SRAM interface
-        self.sram = SRAMInterfaceRecord(addr_width, code.total_bits)
+        self.sram = SRAMInterfaceRecord(addr_width, code.total_bits, dual_write=dual_write,
+                                        registered_read=registered_read)
 
         # Debug information record for simulation testing
         self.debug = DebugInfoRecord(code.total_bits)
 
-    def ports(self) -> List[Signal]:
-        return [*self.req.ports(), *self.rsp.ports(), *self.sram.ports()]
+        self._ports = (*self.req.ports(), *self.rsp.ports(), *self.sram.ports())
+
+    def ports(self) -> Tuple[Signal, ...]:
+        return self._ports
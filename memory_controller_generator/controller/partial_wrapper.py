@@ -1,4 +1,4 @@
-from typing import List
+from typing import Tuple
 
 from amaranth import *
 
@@ -16,7 +16,8 @@ class PartialWriteWrapper(Elaboratable):
     The implementation uses a small state machine to first translate a write request to a read request. After this it
     will wait for the response to the read, and craft a new write operation with the correct bytes replaced with new
     data. This write request is then sent to the memory controller again. The response to this write request will be
-    returned as a response to the original write request.
+    returned as a response to the original write request. The state machine is one-hot encoded, such that every state
+    is decoded from a single register bit.
     """
     def __init__(self, addr_width: int, data_bits: int):
         self.addr_width = addr_width
@@ -28,6 +29,8 @@ class PartialWriteWrapper(Elaboratable):
         self.req_out = MemoryRequestRecord(addr_width, data_bits)
         self.rsp_in = MemoryResponseRecord(data_bits)
 
+        self._ports = (*self.req_in.ports(), *self.rsp_out.ports(), *self.req_out.ports(), *self.rsp_in.ports())
+
     def elaborate(self, platform):
         m = Module()
 
@@ -42,81 +45,83 @@ class PartialWriteWrapper(Elaboratable):
         tmp_req_data = Signal(unsigned(self.data_bits))
         tmp_req_mask = Signal(unsigned(self.data_bits // 8))
 
-        with m.FSM():
-            with m.State("IDLE"):
-                # If the current request has write enabled and a partial mask
-                with m.If(self.req_in.write_en & (~self.req_in.write_mask.all())):
-                    # Mark the output request as read
-                    m.d.comb += [
-                        self.req_out.write_en.eq(0),
-                        self.req_out.debug_ignore.eq(1),
-                    ]
+        # One-hot encoded state of the wrapper, this keeps the next-state and output logic to single state bits
+        state_idle = Signal(reset=1)
+        state_wait_rsp = Signal()
+        # High when the merged write request was not directly accepted, and is held in the temporary registers
+        write_pending = Signal()
 
-                    # Once the request is accepted move to the other state
-                    with m.If(self.req_in.valid & self.req_in.ready):
-                        m.d.sync += [
-                            tmp_req_addr.eq(self.req_in.addr),
-                            tmp_req_data.eq(self.req_in.write_data),
-                            tmp_req_mask.eq(self.req_in.write_mask),
-                        ]
-                        m.next = "WAIT_RSP"
-            with m.State("WAIT_RSP"):
-                # Mark the request input as busy and the request output as invalid
+        with m.If(state_idle):
+            # If the current request has write enabled and a partial mask
+            with m.If(self.req_in.write_en & (~self.req_in.write_mask.all())):
+                # Mark the output request as read
                 m.d.comb += [
-                    self.req_in.ready.eq(0),
-                    self.req_out.valid.eq(0),
+                    self.req_out.write_en.eq(0),
+                    self.req_out.debug_ignore.eq(1),
                 ]
 
+                # Once the request is accepted move to the other state
+                with m.If(self.req_in.valid & self.req_in.ready):
+                    m.d.sync += [
+                        tmp_req_addr.eq(self.req_in.addr),
+                        tmp_req_data.eq(self.req_in.write_data),
+                        tmp_req_mask.eq(self.req_in.write_mask),
+                    ]
+                    m.d.sync += [
+                        state_idle.eq(0),
+                        state_wait_rsp.eq(1),
+                    ]
+        with m.If(state_wait_rsp):
+            # Mark the request input as busy, and output a write request to the address of the original request
+            m.d.comb += [
+                self.req_in.ready.eq(0),
+                self.req_out.addr.eq(tmp_req_addr),
+                self.req_out.write_en.eq(1),
+            ]
+
+            with m.If(write_pending):
+                # Output the saved write request
+                m.d.comb += [
+                    self.req_out.valid.eq(1),
+                    self.req_out.write_data.eq(tmp_req_data),
+                ]
+            with m.Else():
                 # Mark the response input as ready, and the response output as invalid
                 m.d.comb += [
                     self.rsp_in.ready.eq(1),
                     self.rsp_out.valid.eq(0),
                 ]
 
+                # Expand the byte mask to a bit mask, and use it to merge the new bytes with the response
+                expanded_mask = Signal(unsigned(self.data_bits))
                 write_data = Signal(unsigned(self.data_bits))
-                # Save the required bytes from the response
-                for i in range(self.data_bits // 8):
-                    with m.If(tmp_req_mask[i]):
-                        m.d.comb += write_data.word_select(i, 8).eq(tmp_req_data.word_select(i, 8))
-                    with m.Else():
-                        m.d.comb += write_data.word_select(i, 8).eq(self.rsp_in.read_data.word_select(i, 8))
-
-                # Override the request output with a write request
                 m.d.comb += [
-                    self.req_out.addr.eq(tmp_req_addr),
-                    self.req_out.write_en.eq(1),
-                    self.req_out.write_data.eq(write_data),
+                    expanded_mask.eq(Cat(*[Repl(tmp_req_mask[i], 8) for i in range(self.data_bits // 8)])),
+                    write_data.eq((tmp_req_data & expanded_mask) | (self.rsp_in.read_data & ~expanded_mask)),
                 ]
 
-                # Wait until a valid response is presented
-                with m.If(self.rsp_in.valid):
-                    m.d.comb += self.req_out.valid.eq(1)
-
-                    # Check if the request was directly accepted
-                    with m.If(self.req_out.ready):
-                        # Move to state 0
-                        m.next = "IDLE"
-                    with m.Else():
-                        # Otherwise save the write data and move to state 2
-                        m.d.sync += tmp_req_data.eq(write_data)
-                        m.next = "WAIT_REQ"
-            with m.State("WAIT_REQ"):
-                # Mark the request input as busy
-                m.d.comb += self.req_in.ready.eq(0)
-
-                # Output a write request
+                # Output the merged write request as soon as a valid response is presented
                 m.d.comb += [
-                    self.req_out.valid.eq(1),
-                    self.req_out.addr.eq(tmp_req_addr),
-                    self.req_out.write_en.eq(1),
-                    self.req_out.write_data.eq(tmp_req_data),
+                    self.req_out.valid.eq(self.rsp_in.valid),
+                    self.req_out.write_data.eq(write_data),
                 ]
 
-                # Wait until the write request is accepted
-                with m.If(self.req_out.ready):
-                    m.next = "IDLE"
+                # If the write request is not directly accepted, save the write data until it is
+                with m.If(self.rsp_in.valid & ~self.req_out.ready):
+                    m.d.sync += [
+                        tmp_req_data.eq(write_data),
+                        write_pending.eq(1),
+                    ]
+
+            # Move to the idle state once the write request is accepted
+            with m.If(self.req_out.valid & self.req_out.ready):
+                m.d.sync += [
+                    write_pending.eq(0),
+                    state_wait_rsp.eq(0),
+                    state_idle.eq(1),
+                ]
 
         return m
 
-    def ports(self) -> List[Signal]:
-        return [*self.req_in.ports(), *self.rsp_out.ports(), *self.req_out.ports(), *self.rsp_in.ports()]
+    def ports(self) -> Tuple[Signal, ...]:
+        return self._ports
@@ -14,9 +14,10 @@ class MemoryRequestRecord(Record):
             ("write_data", data_width, DIR_FANOUT),
             ("debug_ignore", 1, DIR_FANOUT),
         ], src_loc_at=1)
+        self._ports = tuple(self.fields.values())
 
     def ports(self) -> [Signal]:
-        return self.fields.values()
+        return self._ports
 
 
 class MemoryRequestWithPartialRecord(Record):
@@ -32,9 +33,10 @@ class MemoryRequestWithPartialRecord(Record):
             ("write_data", data_width, DIR_FANOUT),
             ("write_mask", data_width // granularity, DIR_FANOUT),
         ], src_loc_at=1)
+        self._ports = tuple(self.fields.values())
 
     def ports(self) -> [Signal]:
-        return self.fields.values()
+        return self._ports
 
 
 class MemoryResponseRecord(Record):
@@ -48,25 +50,44 @@ class MemoryResponseRecord(Record):
             ("error", 1, DIR_FANOUT),
             ("uncorrectable_error", 1, DIR_FANOUT),
         ], src_loc_at=1)
+        self._ports = tuple(self.fields.values())
 
     def ports(self) -> [Signal]:
-        return self.fields.values()
+        return self._ports
 
 
 class SRAMInterfaceRecord(Record):
-    """Record for SRAM interface signals used by a controller"""
+    """
+    Record for SRAM interface signals used by a controller
 
-    def __init__(self, addr_width: int, data_width: int):
-        super().__init__([
+    When `dual_write` is set, a second write-only port is added to the record. This port maps to the otherwise unused
+    port of a true dual-port SRAM.
+
+    When `registered_read` is set, the controller registers the read data before using it. This register holds its
+    value under the same conditions as the SRAM output, such that it can be mapped onto the output register of an SRAM.
+    """
+
+    def __init__(self, addr_width: int, data_width: int, dual_write: bool = False, registered_read: bool = False):
+        layout = [
             ("clk_en", 1, DIR_FANOUT),
             ("addr", addr_width, DIR_FANOUT),
             ("write_en", 1, DIR_FANOUT),
             ("write_data", data_width, DIR_FANOUT),
             ("read_data", data_width, DIR_FANIN),
-        ], src_loc_at=1)
+        ]
+        if dual_write:
+            layout += [
+                ("wb_addr", addr_width, DIR_FANOUT),
+                ("wb_write_en", 1, DIR_FANOUT),
+                ("wb_write_data", data_width, DIR_FANOUT),
+            ]
+        super().__init__(layout, src_loc_at=1)
+        self.dual_write = dual_write
+        self.registered_read = registered_read
+        self._ports = tuple(self.fields.values())
 
     def ports(self) -> [Signal]:
-        return self.fields.values()
+        return self._ports
 
 
 class DebugInfoRecord(Record):
@@ -77,6 +98,7 @@ class DebugInfoRecord(Record):
             ('flips', total_width, DIR_FANOUT),
             ('ignore', 1, DIR_FANOUT),
         ], src_loc_at=1)
+        self._ports = tuple(self.fields.values())
 
     def ports(self):
-        return self.fields.values()
+        return self._ports
@@ -42,12 +42,17 @@ class MemoryResponseRecord(Record):
 
 
 class SRAMInterfaceRecord(Record):
-    def __init__(self, addr_width: int, data_width: int):
+    def __init__(self, addr_width: int, data_width: int, dual_write: bool = False, registered_read: bool = False):
         self.clk_en: Signal = ...
         self.addr: Signal = ...
         self.write_en: Signal = ...
         self.write_data: Signal = ...
         self.read_data: Signal = ...
+        self.wb_addr: Signal = ...
+        self.wb_write_en: Signal = ...
+        self.wb_write_data: Signal = ...
+        self.dual_write: bool = ...
+        self.registered_read: bool = ...
 
     def ports(self) -> [Signal]: ...
 
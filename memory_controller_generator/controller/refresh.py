@@ -1,8 +1,11 @@
+from typing import Optional
+
 from amaranth import *
 
 from .generic import GenericController
 from .refresh_wrapper import RefreshWrapper
 from .write_back import WriteBackController
+from ..error_correction import GenericCode
 
 
 class RefreshController(GenericController):
@@ -12,14 +15,29 @@ class RefreshController(GenericController):
     This implementation combines the `WriteBackController` with a `RefreshWrapper` to produce a controller which will
     periodically refresh memory locations.
 
-    For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation.
+    For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation. The
+    `num_entries` option is passed to the `RefreshWrapper`, to only refresh the entries that exist in the memory.
+    Variants of this controller override ``refresh_wrapper`` to configure the wrapper differently.
     """
 
+    def __init__(self, code: GenericCode, addr_width: int, num_entries: Optional[int] = None):
+        super().__init__(code, addr_width)
+        self.num_entries = num_entries
+
+    def refresh_wrapper(self) -> RefreshWrapper:
+        """
+        Construct the refresh wrapper for this controller.
+
+        :return: Refresh wrapper module
+        """
+        return RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7,
+                              num_entries=self.num_entries)
+
     def elaborate(self, platform):
         m = Module()
 
         # Create `RefreshWrapper` and `WriteBackController`
-        m.submodules.refresh = refresh = RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7)
+        m.submodules.refresh = refresh = self.refresh_wrapper()
         m.submodules.controller = controller = WriteBackController(self.code, self.addr_width)
 
         # Connect the refresh wrapper and controller to the external signals
@@ -37,7 +55,7 @@ class RefreshController(GenericController):
         return m
 
 
-class ForceRefreshController(GenericController):
+class ForceRefreshController(RefreshController):
     """
     Implementation of an automatically refreshing memory controller with ``force_refresh=True``.
 
@@ -47,30 +65,12 @@ class ForceRefreshController(GenericController):
     For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation.
     """
 
-    def elaborate(self, platform):
-        m = Module()
+    def refresh_wrapper(self) -> RefreshWrapper:
+        return RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7, force_refresh=True,
+                              num_entries=self.num_entries)
 
-        # Create `RefreshWrapper` and `WriteBackController`
-        m.submodules.refresh = refresh = RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7,
-                                                        force_refresh=True)
-        m.submodules.controller = controller = WriteBackController(self.code, self.addr_width)
-
-        # Connect the refresh wrapper and controller to the external signals
-        m.d.comb += [
-            self.req.connect(refresh.req_in),
-            refresh.req_out.connect(controller.req),
-            controller.rsp.connect(refresh.rsp_in),
-            refresh.rsp_out.connect(self.rsp),
-
-            controller.sram.connect(self.sram),
-
-            self.debug.eq(controller.debug),
-        ]
 
-        return m
-
-
-class ContinuousRefreshController(GenericController):
+class ContinuousRefreshController(RefreshController):
     """
     Implementation of an automatically refreshing memory controller with ``refresh_counter_width=0``.
 
@@ -80,29 +80,12 @@ class ContinuousRefreshController(GenericController):
     For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation.
     """
 
-    def elaborate(self, platform):
-        m = Module()
-
-        # Create `RefreshWrapper` and `WriteBackController`
-        m.submodules.refresh = refresh = RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=0)
-        m.submodules.controller = controller = WriteBackController(self.code, self.addr_width)
-
-        # Connect the refresh wrapper and controller to the external signals
-        m.d.comb += [
-            self.req.connect(refresh.req_in),
-            refresh.req_out.connect(controller.req),
-            controller.rsp.connect(refresh.rsp_in),
-            refresh.rsp_out.connect(self.rsp),
-
-            controller.sram.connect(self.sram),
+    def refresh_wrapper(self) -> RefreshWrapper:
+        return RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=0,
+                              num_entries=self.num_entries)
 
-            self.debug.eq(controller.debug),
-        ]
 
-        return m
-
-
-class TopRefreshController(GenericController):
+class TopRefreshController(RefreshController):
     """
     Implementation of an automatically refreshing memory controller which only refreshes the top 128 words.
 
@@ -112,32 +95,14 @@ class TopRefreshController(GenericController):
     For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation.
     """
 
-    def elaborate(self, platform):
-        m = Module()
-
-        # Create `RefreshWrapper` and `WriteBackController`
+    def refresh_wrapper(self) -> RefreshWrapper:
         top_range = 7
         mask = ((1 << (self.addr_width - top_range)) - 1) << top_range
-        m.submodules.refresh = refresh = RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7,
-                                                        address_or=mask)
-        m.submodules.controller = controller = WriteBackController(self.code, self.addr_width)
-
-        # Connect the refresh wrapper and controller to the external signals
-        m.d.comb += [
-            self.req.connect(refresh.req_in),
-            refresh.req_out.connect(controller.req),
-            controller.rsp.connect(refresh.rsp_in),
-            refresh.rsp_out.connect(self.rsp),
-
-            controller.sram.connect(self.sram),
-
-            self.debug.eq(controller.debug),
-        ]
-
-        return m
+        return RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7, address_or=mask,
+                              num_entries=self.num_entries)
 
 
-class TopBottomRefreshController(GenericController):
+class TopBottomRefreshController(RefreshController):
     """
     Implementation of an automatically refreshing memory controller which only refreshes the top and bottom 64 words.
 
@@ -147,26 +112,8 @@ class TopBottomRefreshController(GenericController):
     For details on the implementation of the refresh mechanism see the `RefreshWrapper` implementation.
     """
 
-    def elaborate(self, platform):
-        m = Module()
-
-        # Create `RefreshWrapper` and `WriteBackController`
+    def refresh_wrapper(self) -> RefreshWrapper:
         top_range = 7
         mask = ((1 << (self.addr_width - top_range)) - 1) << top_range
-        m.submodules.refresh = refresh = RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7,
-                                                        address_sext=mask)
-        m.submodules.controller = controller = WriteBackController(self.code, self.addr_width)
-
-        # Connect the refresh wrapper and controller to the external signals
-        m.d.comb += [
-            self.req.connect(refresh.req_in),
-            refresh.req_out.connect(controller.req),
-            controller.rsp.connect(refresh.rsp_in),
-            refresh.rsp_out.connect(self.rsp),
-
-            controller.sram.connect(self.sram),
-
-            self.debug.eq(controller.debug),
-        ]
-
-        return m
+        return RefreshWrapper(self.addr_width, self.code.data_bits, refresh_counter_width=7, address_sext=mask,
+                              num_entries=self.num_entries)
@@ -1,8 +1,10 @@
-from typing import List
+import itertools
+from typing import Tuple, Optional
 
 from amaranth import *
 
 from .record import MemoryResponseRecord, MemoryRequestRecord
+from ..util.lfsr import LFSR_TAPS, lfsr_next, lfsr_terminal
 
 
 class RefreshWrapper(Elaboratable):
@@ -20,25 +22,54 @@ class RefreshWrapper(Elaboratable):
     By setting `force_refresh` the controller will forcefully do a refresh when the counter rolls over. Otherwise it
     will wait for the first cycle where there is no incomming request. While this is generally nicer, since it tries
     to avoid contention on the bus. However, in some cases the bus might be so busy that there is no time for refresh
-    operations. In that case you might want to enable `force_refresh`.
+    operations. In that case you might want to enable `force_refresh`. When `force_refresh_delay` is set as well, a
+    pending refresh still waits for a cycle without an incomming request, but for at most `force_refresh_delay` cycles
+    before it is forced. This hides most refreshes in idle cycles, while still guaranteeing a refresh eventually.
+    Setting `force_refresh_delay` without `force_refresh` is an error.
 
     The options `address_and`, `address_or` and `address_sext` allow for manipulations of the generated refresh
     address. The address counter will first be and-ed with `address_and`, then or-ed with `address_or`. Finally the
     `address_sext` option allows for sign extending a part of the generated address. All one bits in the
-    `address_sext` option result in replacing that address bit with the highest non set bit. By setting the upper `n`
-    bits, the refresh address will only target a low and a high part of the memory. The combination of these options
-    allows for some flexibility in which areas of the memory are actually refreshed.
+    `address_sext` option result in replacing that address bit with the highest non set bit below it, therefore the
+    lowest bit can not be set. By setting the upper `n` bits, the refresh address will only target a low and a high
+    part of the memory. The combination of these options allows for some flexibility in which areas of the memory are
+    actually refreshed.
+
+    By setting `burst_len` every refresh reads `burst_len` consecutive addresses. Once the first refresh of a burst
+    is sent, incomming requests are blocked until the last refresh of the burst is sent, such that the arbitration
+    is only done once per burst.
+
+    The `num_entries` option limits the address counter to the actual number of memory entries, when the memory does
+    not fill the complete address space. The counter then wraps back to zero after the last entry.
+
+    The refresh counter is implemented as a maximal length LFSR when possible, which rolls over every
+    `2 ** refresh_counter_width - 1` cycles. This avoids the carry chain and wide and-reduction of a binary counter.
     """
 
-    def __init__(self, addr_width: int, data_bits: int, refresh_counter_width: int, force_refresh=False, address_and=-1,
-                 address_or=0, address_sext=0):
+    def __init__(self, addr_width: int, data_bits: int, refresh_counter_width: int, force_refresh=False,
+                 force_refresh_delay=0, address_and=-1, address_or=0, address_sext=0, num_entries: Optional[int] = None,
+                 burst_len=1):
+        if num_entries is None:
+            num_entries = 1 << addr_width
+        if not 0 < num_entries <= (1 << addr_width):
+            raise ValueError(f"Number of entries {num_entries} does not fit in an address width of {addr_width}")
+        if burst_len < 1:
+            raise ValueError(f"Burst length {burst_len} should be at least 1")
+        if force_refresh_delay and not force_refresh:
+            raise ValueError("A force refresh delay requires force_refresh to be enabled")
+        if address_sext & 1:
+            raise ValueError("The lowest address bit can not be sign extended, as there is no bit below it")
+
         self.addr_width = addr_width
         self.data_bits = data_bits
         self.refresh_counter_width = refresh_counter_width
         self.force_refresh = force_refresh
+        self.force_refresh_delay = force_refresh_delay
         self.address_and = address_and
         self.address_or = address_or
         self.address_sext = address_sext
+        self.num_entries = num_entries
+        self.burst_len = burst_len
 
         self.req_in = MemoryRequestRecord(addr_width, data_bits)
         self.rsp_out = MemoryResponseRecord(data_bits)
@@ -46,6 +77,8 @@ class RefreshWrapper(Elaboratable):
         self.req_out = MemoryRequestRecord(addr_width, data_bits)
         self.rsp_in = MemoryResponseRecord(data_bits)
 
+        self._ports = (*self.req_in.ports(), *self.rsp_out.ports(), *self.req_out.ports(), *self.rsp_in.ports())
+
     def elaborate(self, platform):
         m = Module()
 
@@ -55,33 +88,79 @@ class RefreshWrapper(Elaboratable):
             self.rsp_in.connect(self.rsp_out),
         ]
 
-        # Create an automatically incrementing counter to periodically refresh
-        counter = Signal(unsigned(self.refresh_counter_width))
-        m.d.sync += counter.eq(counter + 1)
-
-        # Set refresh pending when the counter reaches the maximum value
+        # Create an automatically advancing counter to periodically refresh
+        if self.refresh_counter_width in LFSR_TAPS:
+            counter = Signal(unsigned(self.refresh_counter_width), reset=1)
+            m.d.sync += counter.eq(lfsr_next(counter))
+            counter_rollover = counter == lfsr_terminal(self.refresh_counter_width)
+        else:
+            counter = Signal(unsigned(self.refresh_counter_width))
+            m.d.sync += counter.eq(counter + 1)
+            counter_rollover = counter.all()
+
+        # Set refresh pending when the counter rolls over
         refresh_pending = Signal()
-        with m.If(counter.all()):
+        with m.If(counter_rollover):
             m.d.sync += refresh_pending.eq(1)
 
+        # High when a pending refresh should no longer wait for a cycle without incomming request
+        refresh_urgent = Signal()
+        if self.force_refresh and self.force_refresh_delay > 0:
+            # Count the number of cycles a refresh has been pending
+            urgent_counter = Signal(range(self.force_refresh_delay + 1))
+            with m.If(~refresh_pending):
+                m.d.sync += urgent_counter.eq(0)
+            with m.Elif(~refresh_urgent):
+                m.d.sync += urgent_counter.eq(urgent_counter + 1)
+
+            m.d.comb += refresh_urgent.eq(urgent_counter == self.force_refresh_delay)
+        else:
+            m.d.comb += refresh_urgent.eq(self.force_refresh)
+
         # Keep track of the current refresh address
-        current_address = Signal(unsigned(self.addr_width))
+        current_address = Signal(range(self.num_entries))
+        if self.num_entries == 1 << len(current_address):
+            # When the number of entries fills the counter completely, it wraps around by itself
+            next_address = current_address + 1
+        else:
+            next_address = Mux(current_address == self.num_entries - 1, 0, current_address + 1)
 
         # High when a refresh request has been sent and it is waiting for a response
         waiting_for_response = Signal()
 
+        # High when the first refresh of a burst has been sent, but not the last
+        burst_active = Signal()
+        if self.burst_len > 1:
+            # Keep track of the number of refreshes in the burst after the current one
+            burst_remaining = Signal(range(self.burst_len), reset=self.burst_len - 1)
+
+            # Block any incomming requests for the rest of the burst
+            with m.If(burst_active):
+                m.d.comb += [
+                    self.req_in.ready.eq(0),
+                    self.req_out.valid.eq(0),
+                ]
+
         with m.If(~waiting_for_response):
-            with m.If(refresh_pending & (self.force_refresh | ~self.req_in.valid)):
-                if self.force_refresh:
-                    # Block any incomming requests
-                    m.d.comb += self.req_in.ready.eq(0)
+            with m.If(refresh_pending & (refresh_urgent | burst_active | ~self.req_in.valid)):
+                # Block any incomming requests
+                m.d.comb += self.req_in.ready.eq(0)
 
                 # Apply a read request with the refresh address
+                base_address = Signal(unsigned(self.addr_width))
+                m.d.comb += base_address.eq((current_address & self.address_and) | self.address_or)
+
+                # The sign extended bits are known during elaboration, so every run of them is replaced by copies of
+                # the bit below the run, while the other bits are passed through as slices
                 calc_address = Signal(unsigned(self.addr_width))
-                m.d.comb += calc_address.eq((current_address & self.address_and) | self.address_or)
-                for i in range(self.addr_width):
-                    with m.If(self.address_sext & (1 << i)):
-                        m.d.comb += calc_address[i].eq(calc_address[i - 1])
+                parts = []
+                for sext, run in itertools.groupby(range(self.addr_width), key=lambda i: (self.address_sext >> i) & 1):
+                    run = list(run)
+                    if sext:
+                        parts.append(Repl(base_address[run[0] - 1], len(run)))
+                    else:
+                        parts.append(base_address[run[0]:run[-1] + 1])
+                m.d.comb += calc_address.eq(Cat(*parts))
 
                 m.d.comb += [
                     self.req_out.valid.eq(1),
@@ -94,10 +173,25 @@ class RefreshWrapper(Elaboratable):
                 with m.If(self.req_out.ready):
                     # Increment the current address and start waiting for a response
                     m.d.sync += [
-                        refresh_pending.eq(0),
-                        current_address.eq(current_address + 1),
+                        current_address.eq(next_address),
                         waiting_for_response.eq(1),
                     ]
+
+                    if self.burst_len > 1:
+                        # Only stop refreshing after the last refresh of the burst
+                        with m.If(burst_remaining == 0):
+                            m.d.sync += [
+                                refresh_pending.eq(0),
+                                burst_active.eq(0),
+                                burst_remaining.eq(self.burst_len - 1),
+                            ]
+                        with m.Else():
+                            m.d.sync += [
+                                burst_active.eq(1),
+                                burst_remaining.eq(burst_remaining - 1),
+                            ]
+                    else:
+                        m.d.sync += refresh_pending.eq(0)
         with m.Else():
             # Mark the response input as ready, and the response output as invalid
             m.d.comb += [
@@ -111,5 +205,5 @@ class RefreshWrapper(Elaboratable):
 
         return m
 
-    def ports(self) -> List[Signal]:
-        return [*self.req_in.ports(), *self.rsp_out.ports(), *self.req_out.ports(), *self.rsp_in.ports()]
+    def ports(self) -> Tuple[Signal, ...]:
+        return self._ports
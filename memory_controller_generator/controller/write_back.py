@@ -1,6 +1,7 @@
 from amaranth import *
 
 from .generic import GenericController
+from ..error_correction import GenericCode
 
 
 class WriteBackController(GenericController):
@@ -10,8 +11,33 @@ class WriteBackController(GenericController):
     This memory controller will handle requests normally as long as no errors are detected. However, when the decoder
     detects and corrects an error, the corrected value is immediately written back to the memory, to make sure that
     the value in memory is correct. Doing this operation will block the request stream for one cycle.
+
+    By setting `pipeline` a register stage is added after the encoder and after the decoder, in the same way as for
+    the `BasicController`. The write-back operation is then done from the memory output, before the response is
+    registered, and it will hold the registered request for one cycle.
+
+    By setting `dual_write` the SRAM interface gets a second write port, which is used for the write-back operation.
+    The request stream is then never blocked, and a write-back is only dropped when a request writes to the same
+    address in that cycle, as the newly written value replaces the corrected value anyway.
+
+    By setting `registered_writeback` the write-back operation is done one cycle later, from registered copies of the
+    corrected value and address. This removes the decoder from the paths to the memory and the request ready signal.
+    The write-back is dropped when the memory is written at the same address in the cycle before. Without
+    `dual_write`, it is also dropped when the memory output is still required for a response that is not yet accepted,
+    since the write-back would replace it. A dropped write-back only leaves the correctable error in memory.
+
+    By setting `registered_read` the memory output is registered before it is decoded, which adds one cycle of latency.
+    The write-back operation is then done from the registered value, and is dropped in the same cases as for
+    `registered_writeback`, and when the memory is written at the same address while the value is registered.
     """
 
+    def __init__(self, code: GenericCode, addr_width: int, pipeline: bool = False, dual_write: bool = False,
+                 registered_writeback: bool = False, registered_read: bool = False):
+        super().__init__(code, addr_width, dual_write=dual_write, registered_read=registered_read)
+        self.pipeline = pipeline
+        self.dual_write = dual_write
+        self.registered_writeback = registered_writeback
+
     def elaborate(self, platform):
         m = Module()
 
@@ -21,59 +47,211 @@ class WriteBackController(GenericController):
         req_fire = self.req.valid & self.req.ready
         rsp_fire = self.rsp.valid & self.rsp.ready
 
+        # High when the response stage is empty or its response is accepted this cycle
+        advance = Signal()
+        m.d.comb += advance.eq((self.rsp.valid & self.rsp.ready) | ~self.rsp.valid)
+
         m.d.comb += [
             # Connect request
-            self.sram.clk_en.eq(req_fire),
-            self.sram.addr.eq(self.req.addr),
-            self.sram.write_en.eq(self.req.write_en),
             encoder.data_in.eq(self.req.write_data),
-            self.sram.write_data.eq(encoder.enc_out),
-            self.req.ready.eq((self.rsp.valid & self.rsp.ready) | ~self.rsp.valid),
-
-            # Connect decoder
-            decoder.enc_in.eq(self.sram.read_data),
-            self.rsp.read_data.eq(decoder.data_out),
-            self.rsp.error.eq(decoder.error),
-            self.rsp.uncorrectable_error.eq(decoder.uncorrectable_error),
+            self.req.ready.eq(advance),
         ]
 
-        # When a request fires it is accepted, therefore the response should always be valid on the next cycle
-        with m.If(req_fire):
-            m.d.sync += self.rsp.valid.eq(1)
-        # If no request fires and the response does fire, the buffered response is consumed and no longer valid
-        with m.Elif(rsp_fire):
-            m.d.sync += self.rsp.valid.eq(0)
-
-        # Keep track of when a write-back operation might be valid (after a read request)        
+        # Keep track of when a write-back operation might be valid (after a read request)
         response_writeback_valid = Signal()
-        with m.If(req_fire):
-            m.d.sync += response_writeback_valid.eq(~self.req.write_en)
-        with m.Else():
-            m.d.sync += response_writeback_valid.eq(0)
-        
         # Keep the address of the last request
         last_req_addr = Signal(unsigned(self.addr_width))
-        m.d.sync += last_req_addr.eq(self.req.addr)
+        # High when a corrected value should be written back this cycle, together with its address and data
+        wb_sel = Signal()
+        wb_addr = Signal(unsigned(self.addr_width))
+        wb_write_data = Signal(unsigned(self.code.total_bits))
+        # Encoded write data of the request which is sent to the memory
+        req_write_data = Signal(unsigned(self.code.total_bits))
+
+        # Keep track of when the memory output belongs to a request
+        sram_rsp_valid = Signal()
+        sram_rsp_ignore = Signal()
+        # With a registered read, keep track of when the memory output belongs to a read request
+        sram_rsp_read = Signal()
+
+        if self.pipeline:
+            # Register the encoded request before sending it to the memory
+            sram_req_valid = Signal()
+            sram_req_addr = Signal(unsigned(self.addr_width))
+            sram_req_write_en = Signal()
+            sram_req_write_data = Signal(unsigned(self.code.total_bits))
+            sram_req_ignore = Signal()
+            with m.If(self.req.ready):
+                m.d.sync += [
+                    sram_req_valid.eq(self.req.valid),
+                    sram_req_addr.eq(self.req.addr),
+                    sram_req_write_en.eq(self.req.write_en),
+                    sram_req_write_data.eq(encoder.enc_out),
+                    sram_req_ignore.eq(self.req.debug_ignore),
+                ]
+
+            # The registered request is sent to the memory when a new request could be accepted
+            sram_req_fire = sram_req_valid & self.req.ready
+            m.d.comb += [
+                self.sram.clk_en.eq(sram_req_fire),
+                self.sram.addr.eq(sram_req_addr),
+                self.sram.write_en.eq(sram_req_write_en),
+                req_write_data.eq(sram_req_write_data),
+            ]
+
+            with m.If(sram_req_fire):
+                m.d.sync += last_req_addr.eq(sram_req_addr)
+
+            with m.If(advance):
+                m.d.sync += [
+                    sram_rsp_valid.eq(sram_req_fire),
+                    sram_rsp_ignore.eq(sram_req_ignore),
+                ]
+
+            if self.sram.registered_read:
+                with m.If(advance):
+                    m.d.sync += sram_rsp_read.eq(sram_req_fire & ~sram_req_write_en)
+            else:
+                m.d.sync += response_writeback_valid.eq(sram_req_fire & ~sram_req_write_en)
+        else:
+            m.d.comb += [
+                # Connect request
+                self.sram.clk_en.eq(req_fire),
+                self.sram.addr.eq(self.req.addr),
+                self.sram.write_en.eq(self.req.write_en),
+                req_write_data.eq(encoder.enc_out),
+            ]
+
+            # Only update the address when a request is accepted, to keep the address register from toggling
+            with m.If(req_fire):
+                m.d.sync += last_req_addr.eq(self.req.addr)
+
+            if self.sram.registered_read:
+                # The memory output moves on to the read data register when the response stage advances
+                with m.If(advance):
+                    m.d.sync += [
+                        sram_rsp_valid.eq(req_fire),
+                        sram_rsp_read.eq(req_fire & ~self.req.write_en),
+                        sram_rsp_ignore.eq(self.req.debug_ignore),
+                    ]
+            else:
+                # When a request fires it is accepted, therefore the response should always be valid on the next cycle
+                with m.If(req_fire):
+                    m.d.sync += sram_rsp_valid.eq(1)
+                # If no request fires and the response does fire, the buffered response is consumed and no longer
+                # valid
+                with m.Elif(rsp_fire):
+                    m.d.sync += sram_rsp_valid.eq(0)
+
+                m.d.sync += [
+                    response_writeback_valid.eq(req_fire & ~self.req.write_en),
+                    sram_rsp_ignore.eq(self.req.debug_ignore),
+                ]
+
+        # The memory output is required until it is moved on to the next stage
+        sram_rsp_required = sram_rsp_valid & ~advance
+
+        def written(addr):
+            """High when the memory is written at this address in the current cycle"""
+            return self.sram.clk_en & self.sram.write_en & (self.sram.addr == addr)
+
+        if self.sram.registered_read:
+            # Register the memory output before decoding it, this register maps onto the output register of the SRAM
+            dec_enc_in = Signal(unsigned(self.code.total_bits))
+            dec_valid = Signal()
+            dec_ignore = Signal()
+            dec_addr = Signal(unsigned(self.addr_width))
+            with m.If(advance):
+                m.d.sync += [
+                    dec_enc_in.eq(self.sram.read_data),
+                    dec_valid.eq(sram_rsp_valid),
+                    dec_ignore.eq(sram_rsp_ignore),
+                    dec_addr.eq(last_req_addr),
+
+                    # A write to the same address, while the read value moves to the register, replaces that value
+                    response_writeback_valid.eq(sram_rsp_read & ~written(last_req_addr)),
+                ]
+            with m.Else():
+                m.d.sync += response_writeback_valid.eq(0)
+
+            m.d.comb += decoder.enc_in.eq(dec_enc_in)
+        else:
+            dec_valid = sram_rsp_valid
+            dec_ignore = sram_rsp_ignore
+            dec_addr = last_req_addr
+
+            m.d.comb += decoder.enc_in.eq(self.sram.read_data)
+
+        if self.pipeline:
+            # Register the decoded response
+            with m.If(advance):
+                m.d.sync += [
+                    self.rsp.valid.eq(dec_valid),
+                    self.rsp.read_data.eq(decoder.data_out),
+                    self.rsp.error.eq(decoder.error),
+                    self.rsp.uncorrectable_error.eq(decoder.uncorrectable_error),
+                ]
+        else:
+            # Connect decoder
+            m.d.comb += [
+                self.rsp.valid.eq(dec_valid),
+                self.rsp.read_data.eq(decoder.data_out),
+                self.rsp.error.eq(decoder.error),
+                self.rsp.uncorrectable_error.eq(decoder.uncorrectable_error),
+            ]
+
+        m.d.comb += self.debug.ignore.eq(dec_ignore)
 
         # If the previous request was a read and the decoder detected a correctable error
-        with m.If(response_writeback_valid & decoder.error & ~decoder.uncorrectable_error):
-            # Do not accept a request this cycle
-            m.d.comb += self.req.ready.eq(0)
+        wb_detected = response_writeback_valid & decoder.error & ~decoder.uncorrectable_error
+        # High when the memory is written at the write-back address this cycle, which is newer than the corrected value
+        wb_overwritten = written(wb_addr)
+
+        if self.registered_writeback:
+            # Register the write-back operation, unless the address is overwritten before it could be done
+            m.d.sync += [
+                wb_sel.eq(wb_detected & ~written(dec_addr)),
+                wb_addr.eq(dec_addr),
+                wb_write_data.eq(decoder.enc_out),
+            ]
+        else:
+            m.d.comb += [
+                wb_sel.eq(wb_detected),
+                wb_addr.eq(dec_addr),
+                wb_write_data.eq(decoder.enc_out),
+            ]
 
-            # Write the corrected value back to the memory. This does not cause a response to be created, as no request
-            # is accepted from the external interface.
+        if self.dual_write:
+            # Write the corrected value back through the second port, without blocking the request stream
             m.d.comb += [
-                self.sram.clk_en.eq(1),
-                self.sram.addr.eq(last_req_addr),
-                self.sram.write_en.eq(1),
-                self.sram.write_data.eq(decoder.enc_out),
+                self.sram.write_data.eq(req_write_data),
+
+                self.sram.wb_addr.eq(wb_addr),
+                self.sram.wb_write_en.eq(wb_sel & ~wb_overwritten),
+                self.sram.wb_write_data.eq(wb_write_data),
             ]
+        else:
+            # Select between the encoded request and the corrected value in one place
+            m.d.comb += self.sram.write_data.eq(Mux(wb_sel, wb_write_data, req_write_data))
+
+            with m.If(wb_sel):
+                # Do not accept a request this cycle
+                m.d.comb += self.req.ready.eq(0)
+
+                # Write the corrected value back to the memory. This does not cause a response to be created, as no
+                # request is accepted from the external interface. Without registering the write-back or the read
+                # data, the memory output belongs to the same address, so reading it again does not change it.
+                registered = self.registered_writeback or self.sram.registered_read
+                m.d.comb += [
+                    self.sram.clk_en.eq(~sram_rsp_required if registered else 1),
+                    self.sram.addr.eq(wb_addr),
+                    self.sram.write_en.eq(1),
+                ]
 
         m.d.comb += [
             self.debug.error.eq(decoder.error),
             self.debug.uncorrectable_error.eq(decoder.uncorrectable_error),
             self.debug.flips.eq(decoder.flips),
         ]
-        m.d.sync += self.debug.ignore.eq(self.req.debug_ignore)
 
         return m
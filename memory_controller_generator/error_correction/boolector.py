@@ -1,18 +1,21 @@
 import abc
 import logging
+import multiprocessing
+import operator
 import signal
 import time
 from dataclasses import dataclass
-from functools import reduce
-from typing import Optional, List, Sequence
+from typing import Optional, List, Sequence, Tuple, Dict, Any
 
 import numpy as np
 import pyboolector
 from amaranth.utils import bits_for
+from numpy.typing import NDArray
 from pyboolector import Boolector, BoolectorNode
 
 from . import GenericCode
 from ..util.matrix import generator_matrix_from_parity_check_matrix
+from ..util.reduce import tree_reduce
 
 sigint_tripped = False
 """Global flag indicating if SIGINT was raised"""
@@ -29,6 +32,16 @@ def termination_function(start, timeout):
     return (time.time() - start > timeout) or sigint_tripped
 
 
+PORTFOLIO_REWRITE_LEVELS = (None, 2, 1, 0)
+"""Boolector rewrite levels used by the workers of a portfolio in order, None is the default level of ``solver``"""
+
+
+def _portfolio_worker(job):
+    """Solve a copy of the code in a worker process of the portfolio"""
+    code, timeout, rewrite_level = job
+    return code._solve(timeout, rewrite_level)
+
+
 @dataclass
 class BoolectorOptimizationGoal:
     """
@@ -65,10 +78,15 @@ class BoolectorCode(GenericCode):
     be used as a reference for implementing other codes.
     """
 
-    def __init__(self, data_bits, parity_bits):
+    def __init__(self, data_bits, parity_bits, workers: int = 1):
         super().__init__(data_bits=data_bits, parity_bits=parity_bits)
 
+        if not 1 <= workers <= len(PORTFOLIO_REWRITE_LEVELS):
+            raise ValueError(f"Number of workers must be between 1 and {len(PORTFOLIO_REWRITE_LEVELS)}")
+        self.workers = workers
+
         self.boolector: Boolector = None
+        self._complete_result: Optional[Tuple[NDArray, List[int], bool]] = None
         self.data_vars = []
         self.parity_vars = []
         self.all_vars = []
@@ -76,34 +94,99 @@ class BoolectorCode(GenericCode):
         self.row_popcount_max = None
         self.total_popcount = None
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Get the state of this code for pickling, such as when it is sent to the workers of a portfolio.
+
+        The Boolector instance and its nodes cannot be pickled, so they are replaced by the values they have before a
+        model is built. The next solve of the unpickled code then builds a new model.
+        """
+        state = self.__dict__.copy()
+        state.update(self._empty_model_state())
+        return state
+
+    def _empty_model_state(self) -> Dict[str, Any]:
+        """
+        Attributes referring to the Boolector instance or its nodes, with their values before a model is built.
+        Codes that keep their own nodes should extend this.
+        """
+        return {
+            "boolector": None,
+            "data_vars": [],
+            "parity_vars": [],
+            "all_vars": [],
+            "row_popcount_max": None,
+            "total_popcount": None,
+        }
+
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
         """
         Generate the parity-check and generator matrices for this error correction code.
 
+        If more than one worker is selected, a portfolio of Boolector instances with different rewrite levels is run
+        in parallel processes. The best model found by any of the workers is used, and once a worker has fully
+        optimized all goals the other workers are stopped. When a previous run already fully optimized all goals,
+        its result is used directly, as the portfolio cannot improve on it.
+
         :param timeout: Optional timeout in seconds
         :return: None
         """
-        # Create a Boolector instance and set the MODEL_GEN and INCREMENTAL options
-        self.boolector = b = Boolector()
-        b.Set_opt(pyboolector.BTOR_OPT_MODEL_GEN, True)
-        b.Set_opt(pyboolector.BTOR_OPT_INCREMENTAL, True)
+        if self._complete_result is not None:
+            model, _, _ = self._complete_result
+        elif self.workers > 1:
+            model = self._solve_portfolio(timeout)
+        else:
+            model, _, _ = self._solve(timeout)
+        if model is None:
+            raise ValueError("Unable to generate a model")
+
+        self.parity_check_matrix = model
+        self.generator_matrix = generator_matrix_from_parity_check_matrix(self.parity_check_matrix)
+
+    def _solve(self, timeout: Optional[float], rewrite_level: Optional[int] = None) \
+            -> Tuple[Optional[NDArray], List[int], bool]:
+        """
+        Build the Boolector model of this code and optimize it, see ``_optimize`` for the return value.
+
+        The result of a run that fully optimized all goals is kept on the code, and returned directly when this method
+        is called again, as the goals were already proven optimal and another run cannot improve on them. A run that
+        was terminated is not kept and cannot be continued, as the termination of Boolector is permanent, so the next
+        call builds a new Boolector instance and optimizes from the start.
+        """
+        if self._complete_result is not None:
+            return self._complete_result
+
+        self._build_model(rewrite_level)
+        b = self.boolector
 
         # Register the SIGINT handler and enable the termination function of Boolector
         signal.signal(signal.SIGINT, sigint_handler)
         b.Set_term(termination_function, (time.time(), timeout))
 
+        # Run the Boolector optimizer to generate the parity-check matrix
+        model, values, complete = self._optimize()
+        if complete:
+            self._complete_result = (model, values, complete)
+        return model, values, complete
+
+    def _build_model(self, rewrite_level: Optional[int]) -> None:
+        """Create a new Boolector instance with the variables and conditions of this code."""
+        self.boolector = b = self.solver(rewrite_level=rewrite_level)
+
         # Define the BitVector sort for parity-check matrix columns
         column_sort = b.BitVecSort(self.parity_bits)
 
         # Create the variables for the data and parity columns
-        for i in range(self.data_bits):
-            self.data_vars.append(b.Var(column_sort, f"d{i}"))
-        for i in range(self.parity_bits):
-            self.parity_vars.append(b.Var(column_sort, f"p{i}"))
+        self.data_vars = [b.Var(column_sort, f"d{i}") for i in range(self.data_bits)]
+        self.parity_vars = [b.Var(column_sort, f"p{i}") for i in range(self.parity_bits)]
 
         # Create a list of all variables
         self.all_vars = [*self.data_vars, *self.parity_vars]
 
+        # Nodes of a previous Boolector instance cannot be reused
+        self.row_popcount_max = None
+        self.total_popcount = None
+
         # Force the parity columns to be one-hot
         for i in range(self.parity_bits):
             b.Assert(self.parity_vars[i] == (1 << i))
@@ -115,71 +198,131 @@ class BoolectorCode(GenericCode):
         # Apply all subclass defined conditions
         self.conditions()
 
-        # Run the Boolector optimizer to generate the parity-check matrix
-        model = self._optimize()
-        if model is None:
-            raise ValueError("Unable to generate a model")
+    def solver(self, rewrite_level: Optional[int] = None) -> Boolector:
+        """
+        Construct the Boolector instance used to generate the parity-check matrix.
 
-        self.parity_check_matrix = model
-        self.generator_matrix = generator_matrix_from_parity_check_matrix(self.parity_check_matrix)
+        The instance is always created with model generation and incremental solving enabled, as these are required
+        by the optimization. Codes that benefit from a different solver configuration, such as another SAT engine,
+        can override this method and set additional options on the returned instance.
+
+        :param rewrite_level: Optional Boolector rewrite level, the Boolector default is used if not specified
+        :return: configured Boolector instance
+        """
+        b = Boolector()
+        b.Set_opt(pyboolector.BTOR_OPT_MODEL_GEN, True)
+        b.Set_opt(pyboolector.BTOR_OPT_INCREMENTAL, True)
+        if rewrite_level is not None:
+            b.Set_opt(pyboolector.BTOR_OPT_REWRITE_LEVEL, rewrite_level)
+        return b
+
+    def _solve_portfolio(self, timeout: Optional[float]) -> Optional[NDArray]:
+        """Run ``_solve`` in parallel worker processes with different rewrite levels, and return the best model."""
+        # The parent only waits for the workers, which will handle SIGINT themselves
+        signal.signal(signal.SIGINT, sigint_handler)
+
+        best_model = None
+        best_values = None
+        with multiprocessing.Pool(self.workers) as pool:
+            jobs = [(self, timeout, rewrite_level) for rewrite_level in PORTFOLIO_REWRITE_LEVELS[:self.workers]]
+            for model, values, complete in pool.imap_unordered(_portfolio_worker, jobs):
+                if model is None:
+                    continue
+                # Goals are optimized in order, so the values are compared in the same order
+                if best_values is None or values < best_values:
+                    best_model, best_values = model, values
+                if complete:
+                    # This worker reached the optimum of all goals, so no other worker can do better
+                    logging.debug("Portfolio worker finished all optimization goals")
+                    self._complete_result = (best_model, best_values, complete)
+                    break
+
+        return best_model
 
     def _parity_check_matrix_from_model(self):
         """Create a numpy matrix from the Boolector variable assignments."""
-        matrix = np.empty((self.parity_bits, self.total_bits), dtype=int)
+        # Each assignment is a string of the column bits with the most significant bit first, convert all of them at
+        # once and flip the bit order to get the rows of the column
+        assignments = "".join(var.assignment for var in self.all_vars).encode("ascii")
+        columns = np.frombuffer(assignments, dtype=np.uint8).reshape(self.total_bits, self.parity_bits) - ord("0")
 
-        for i, var in enumerate(self.all_vars):
-            col = np.fromiter(var.assignment[::-1], dtype=int)
-            matrix[:, i] = col
+        return np.ascontiguousarray(columns[:, ::-1].T)
 
-        return matrix
+    def _optimize(self) -> Tuple[Optional[NDArray], List[int], bool]:
+        """
+        Run Boolector multiple times to generate a parity-check matrix and optimize it.
 
-    def _optimize(self) -> Optional:
-        """Run Boolector multiple times to generate a parity-check matrix and optimize it."""
+        :return: best parity-check matrix, the values of the optimization goals for this matrix, and whether all goals
+                 were fully optimized before the termination function was triggered
+        """
         b = self.boolector
         optimisation_goals = self.optimization_goals()
 
+        def goal_values() -> List[int]:
+            """Values of all optimization goals in the current model"""
+            return [int(goal.expression.assignment, 2) for goal in optimisation_goals]
+
         # Run an initial satisfiability check
         result = b.Sat()
         if result == b.SAT:
             best_model = self._parity_check_matrix_from_model()
+            best_values = goal_values()
         else:
             # This model cannot be satisfied at all
-            return None
+            return None, [], False
 
-        for opt_goal in optimisation_goals:
+        for goal_idx, opt_goal in enumerate(optimisation_goals):
+            # The best model so far already satisfies the goal with its current value, so the search starts there
+            opt_best = best_values[goal_idx]
+            lower_bound = opt_goal.lower_bound
+            upper_bound = min(opt_best, opt_goal.upper_bound)
             logging.debug(f"Starting optimisation of {opt_goal.description} " +
-                          f"from {opt_goal.upper_bound} down to {opt_goal.lower_bound}")
-            opt_best = None
-
-            # Assume that the optimization goal can be satisfied
-            b.Assume(opt_goal.expression <= opt_goal.upper_bound)
-
-            while True:
+                          f"from {upper_bound} down to {lower_bound}")
+
+            # Search for the lowest satisfiable value, a goal that is already at its lower bound is skipped. The search
+            # first steps down from the best assignment, doubling the step after every improvement, as targets far
+            # below the optimum can take very long to prove unsatisfiable. After the first unsatisfiable target the
+            # remaining range is bisected.
+            step = 1
+            while lower_bound < upper_bound:
                 # Attempt to satisfy the optimization goal
+                if step is not None:
+                    target = max(upper_bound - step, lower_bound)
+                else:
+                    target = (lower_bound + upper_bound - 1) // 2
+                b.Assume(opt_goal.expression <= target)
                 result = b.Sat()
                 if result == b.SAT:
                     # A model could be found for this optimization goal
                     best_model = self._parity_check_matrix_from_model()
+                    best_values = goal_values()
 
-                    opt_best = int(opt_goal.expression.assignment, 2)
+                    opt_best = best_values[goal_idx]
                     logging.debug(f"Found assignment with {opt_best}")
 
-                    # Attempt to lower the goal for optimization
-                    b.Fixate_assumptions()
-                    if opt_best == opt_goal.lower_bound:
-                        logging.debug("Lower bound reached")
-                        break
-                    b.Assume(opt_goal.expression < opt_best)
+                    # The assignment might be lower than the target, continue searching below it
+                    upper_bound = opt_best
+                    if step is not None:
+                        step *= 2
                 elif result == b.UNSAT:
-                    # Optimization of this goal cannot be improved
-                    logging.debug(f"Cannot improve the optimization of {opt_goal.description} more than {opt_best}")
-                    break
+                    # No assignment exists up to the target, continue searching above it
+                    lower_bound = target + 1
+                    step = None
                 else:
                     # The termination function was triggered
                     logging.debug("Termination by SIGINT or timeout was triggered")
-                    return best_model
+                    return best_model, best_values, False
 
-        return best_model
+            if opt_best <= opt_goal.lower_bound:
+                logging.debug("Lower bound reached")
+            else:
+                # Optimization of this goal cannot be improved
+                logging.debug(f"Cannot improve the optimization of {opt_goal.description} more than {opt_best}")
+
+            # Keep the optimized value while optimizing the next goals
+            b.Assert(opt_goal.expression <= opt_best)
+
+        return best_model, best_values, True
 
     @abc.abstractmethod
     def conditions(self) -> None:
@@ -236,17 +379,14 @@ class BoolectorCode(GenericCode):
         total_matrix_bits = self.parity_bits * self.total_bits
         count_bits_required = bits_for(total_matrix_bits)
 
-        # Zero and one constant values
+        # Zero constant value
         zero = b.Const(0, count_bits_required)
-        one = b.Const(1, count_bits_required)
 
-        # For each row count the number of bits set
+        # For each row count the number of bits set, by adding the zero-extended bits of that row
         bits_set_in_row = []
         for row in reversed(range(self.parity_bits)):
-            bits_set = b.Const(0, count_bits_required)
-            for col in range(self.total_bits):
-                bits_set += b.Cond(self.all_vars[col][row] == 0, zero, one)
-            bits_set_in_row.append(bits_set)
+            bits = [b.Uext(self.all_vars[col][row], count_bits_required - 1) for col in range(self.total_bits)]
+            bits_set_in_row.append(tree_reduce(operator.add, bits, zero))
 
         # Max function for boolector expressions
         def boolector_max(p, q):
@@ -254,10 +394,10 @@ class BoolectorCode(GenericCode):
             condition = b.Ugte(p, q)
             return b.Cond(condition, p, q)
 
-        # Calculate the maximum number of bits set per row
-        self.row_popcount_max = reduce(boolector_max, bits_set_in_row)
+        # Calculate the maximum number of bits set per row, using a tree of comparisons instead of a chain
+        self.row_popcount_max = tree_reduce(boolector_max, bits_set_in_row, zero)
         # Calculate the total number of bits set
-        self.total_popcount = sum(bits_set_in_row)
+        self.total_popcount = tree_reduce(operator.add, bits_set_in_row, zero)
 
     def maximum_ones_per_row_optimization_goal(self) -> BoolectorOptimizationGoal:
         """
@@ -306,3 +446,42 @@ class BoolectorCode(GenericCode):
         for i in range(length):
             for j in range(i + 1, length):
                 self.boolector.Assert(expressions[i] != expressions[j])
+
+    def assert_all_unique_sorted(self, expressions: Sequence[BoolectorNode]) -> None:
+        """
+        Assert that all expressions in the list have a unique value, using a sorting network.
+
+        The expressions are sorted by an odd-even merge exchange network (Knuth, TAOCP Vol. 3, Algorithm 5.2.2M),
+        after which every sorted value has to be strictly smaller than its successor. This only requires
+        O(n log^2 n) comparators and n - 1 assertions, instead of the n^2 / 2 assertions of ``assert_all_unique``.
+
+        :param expressions: List of expressions
+        :return: None
+        """
+        b = self.boolector
+        values = list(expressions)
+        length = len(values)
+        if length < 2:
+            return
+
+        # Sort the values using compare-exchange operations, the result is always a permutation of the input
+        t = (length - 1).bit_length()
+        p = 1 << (t - 1)
+        while p > 0:
+            q = 1 << (t - 1)
+            r = 0
+            d = p
+            while d > 0:
+                for i in range(length - d):
+                    if i & p == r:
+                        swap = b.Ugt(values[i], values[i + d])
+                        values[i], values[i + d] = (b.Cond(swap, values[i + d], values[i]),
+                                                    b.Cond(swap, values[i], values[i + d]))
+                d = q - p
+                q >>= 1
+                r = p
+            p >>= 1
+
+        # All values are unique if the sorted values are strictly increasing
+        for i in range(1, length):
+            b.Assert(b.Ult(values[i - 1], values[i]))
@@ -1,7 +1,9 @@
 import itertools
 import logging
 import math
-from typing import List, Optional
+import operator
+from functools import reduce
+from typing import List, Optional, Dict, Tuple, Any
 
 import numpy as np
 from amaranth.utils import bits_for
@@ -9,7 +11,7 @@ from pyboolector import BoolectorNode
 
 from . import BoolectorCode
 from .boolector import BoolectorOptimizationGoal
-from ..util.reduce import or_reduce
+from ..util.reduce import tree_reduce
 
 
 class DuttaToubaCode(BoolectorCode):
@@ -33,7 +35,7 @@ class DuttaToubaCode(BoolectorCode):
     SEC-DED-DAEC Code. 25th IEEE VLSI Test Symposium (VTS’07), 349–354. https://doi.org/10.1109/VTS.2007.40
     """
 
-    def __init__(self, data_bits):
+    def __init__(self, data_bits, workers: int = 1):
         # Determine the number of parity bits required for the specified number of data bits
         parity_bits = 0
         for m in itertools.count():
@@ -41,7 +43,7 @@ class DuttaToubaCode(BoolectorCode):
                 parity_bits = m + 1
                 break
 
-        super().__init__(data_bits=data_bits, parity_bits=parity_bits)
+        super().__init__(data_bits=data_bits, parity_bits=parity_bits, workers=workers)
 
         # Mark all single bit errors as correctable
         for i in range(self.total_bits):
@@ -51,6 +53,7 @@ class DuttaToubaCode(BoolectorCode):
             self.correctable_errors.append((i - 1, i))
 
         self.correctable_syndromes: List[BoolectorNode] = []
+        self._syndrome_nodes: Dict[Tuple[int, ...], BoolectorNode] = {}
 
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
         super().generate_matrices(timeout=timeout)
@@ -65,50 +68,47 @@ class DuttaToubaCode(BoolectorCode):
         Determine the detectable errors from the parity-check matrix, as this is not possible to do in any other way.
         Not all random 2-bit errors are detectable by this code.
         """
+        # Use the packed columns of the parity-check matrix, so syndromes can be compared as integers
+        columns = self.parity_check_columns()
+
         # Calculate all correctable syndromes
-        correctable_syndromes = []
-        for column in self.parity_check_matrix.T:
-            correctable_syndromes.append(column)
-        for i in range(1, self.total_bits):
-            correctable_syndromes.append(self.parity_check_matrix[:, i - 1] ^ self.parity_check_matrix[:, i])
+        correctable_syndromes = np.concatenate([columns, columns[:-1] ^ columns[1:]])
 
         # Check for overlapping syndromes in all 2-bit random errors
-        overlapping_count = 0
-        for i in range(self.total_bits):
-            for j in range(i + 2, self.total_bits):
-                result = self.parity_check_matrix[:, i] ^ self.parity_check_matrix[:, j]
-
-                for column in correctable_syndromes:
-                    if np.array_equal(column, result):
-                        overlapping_count += 1
-                        break
-                else:
-                    self.detectable_errors.append((i, j))
+        first, second = np.triu_indices(self.total_bits, k=2)
+        overlapping = np.isin(columns[first] ^ columns[second], correctable_syndromes)
+        overlapping_count = int(np.count_nonzero(overlapping))
+        self.detectable_errors = list(zip(first[~overlapping].tolist(), second[~overlapping].tolist()))
 
         # Show information message containing the percentage of miscorrected syndromes
         total = sum(range(1, self.total_bits - 1))
         percentage = 100 * overlapping_count / total
         logging.info(f"Miscorrected syndromes: {overlapping_count}/{total} ({percentage:.2f}%)")
 
+    def _empty_model_state(self) -> Dict[str, Any]:
+        return {**super()._empty_model_state(), "correctable_syndromes": [], "_syndrome_nodes": {}}
+
     def conditions(self) -> None:
         # Collect all correctable syndromes
-        self.correctable_syndromes = []
+        self._syndrome_nodes = {}
 
-        # All single column syndromes should be correctable
-        for i in range(self.total_bits):
-            self.correctable_syndromes.append(self.all_vars[i])
-        # All adjacent column syndromes should be correctable
-        for i in range(1, self.total_bits):
-            self.correctable_syndromes.append(self.all_vars[i - 1] ^ self.all_vars[i])
+        # All single column and adjacent column syndromes should be correctable
+        self.correctable_syndromes = [self._syndrome_node(error) for error in self.correctable_errors]
 
         # Assert that all correctable syndromes are unique
-        self.assert_all_unique(self.correctable_syndromes)
+        self.assert_all_unique_sorted(self.correctable_syndromes)
 
         # Assert that every column has an odd weight
         b = self.boolector
         for i in range(self.total_bits):
             b.Assert(b.Redxor(self.all_vars[i]) == 1)
 
+    def _syndrome_node(self, error: Tuple[int, ...]) -> BoolectorNode:
+        """Get the syndrome expression of an error, reusing the expression when it was built before"""
+        if error not in self._syndrome_nodes:
+            self._syndrome_nodes[error] = reduce(operator.xor, (self.all_vars[i] for i in error))
+        return self._syndrome_nodes[error]
+
     def optimization_goals(self) -> List[BoolectorOptimizationGoal]:
         # Calculate the minimum total bitcount
         total_ones_lowerbound = 0
@@ -138,15 +138,20 @@ class DuttaToubaCode(BoolectorCode):
 
         b = self.boolector
         const_zero = b.Const(0, bits_requried)
-        const_one = b.Const(1, bits_requried)
+
+        # Mark all correctable syndromes in an array, such that each random error only requires a single read to
+        # determine if its syndrome overlaps with a correctable syndrome
+        correctable_table = b.ConstArray(b.ArraySort(b.BitVecSort(self.parity_bits), b.BitVecSort(1)), b.Const(0, 1))
+        for corr_syn in self.correctable_syndromes:
+            correctable_table = b.Write(correctable_table, corr_syn, b.Const(1, 1))
 
         # Count the number of overlapping syndromes
-        overlapping_syndromes = b.Const(0, bits_requried)
+        overlapping = []
         for i in range(self.total_bits):
             for j in range(i + 2, self.total_bits):
-                syndrome = self.all_vars[i] ^ self.all_vars[j]
-                match = or_reduce(syndrome == corr_syn for corr_syn in self.correctable_syndromes)
-                overlapping_syndromes += b.Cond(match, const_one, const_zero)
+                match = b.Read(correctable_table, self._syndrome_node((i, j)))
+                overlapping.append(b.Uext(match, bits_requried - 1))
+        overlapping_syndromes = tree_reduce(operator.add, overlapping, const_zero)
 
         # Minimize the number of overlapping syndromes
         overlapping_syndromes_goal = BoolectorOptimizationGoal(
@@ -1,14 +1,18 @@
 import abc
+import itertools
 import logging
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Callable, Any, Dict
 
 import numpy as np
 from amaranth import *
 from numpy.typing import NDArray
 
-from ..util.matrix import np_array_to_value, generator_matrix_from_parity_check_matrix
-from ..util.reduce import or_reduce, xor_reduce
+from ..util.matrix import nonzero_per_row
+from ..util.reduce import xor_reduce, or_reduce_bits_each
+
+_matrix_cache: Dict[Tuple[str, int, int], Tuple[NDArray, NDArray]] = {}
+"""Matrices of the codes created by ``generate_matrices_cached`` in this process, by class name and size"""
 
 
 class GenericCode(abc.ABC):
@@ -20,12 +24,18 @@ class GenericCode(abc.ABC):
     method, which determines the parity-check and generator matrix for the code. More complex codes can override the
     ``encoder`` and ``decoder`` methods to return specialised encoder and decoder modules instead of using the
     ``GenericEncoder`` and ``GenericDecoder``.
+
+    The layouts that the generic modules derive from the matrices are cached on the code, such that elaborating
+    multiple encoders and decoders for the same code does not recalculate them. Assigning a new matrix or a new list of
+    correctable or detectable errors clears the cache, modifying one of these lists in place after the layouts were
+    used does not.
     """
 
     def __init__(self, data_bits: int, parity_bits: int) -> None:
         self.data_bits = data_bits
         self.parity_bits = parity_bits
 
+        self._layouts: Dict[str, Any] = {}
         self.generator_matrix: Optional[NDArray] = None
         self.parity_check_matrix: Optional[NDArray] = None
         self.correctable_errors: List[Tuple] = []
@@ -40,6 +50,151 @@ class GenericCode(abc.ABC):
         """
         return self.data_bits + self.parity_bits
 
+    @property
+    def generator_matrix(self) -> Optional[NDArray]:
+        """The generator matrix of this code, or None if it was not yet generated."""
+        return self._generator_matrix
+
+    @generator_matrix.setter
+    def generator_matrix(self, value: Optional[NDArray]) -> None:
+        self._generator_matrix = value
+        self._layouts.clear()
+
+    @property
+    def parity_check_matrix(self) -> Optional[NDArray]:
+        """The parity-check matrix of this code, or None if it was not yet generated."""
+        return self._parity_check_matrix
+
+    @parity_check_matrix.setter
+    def parity_check_matrix(self, value: Optional[NDArray]) -> None:
+        self._parity_check_matrix = value
+        self._layouts.clear()
+
+    @property
+    def correctable_errors(self) -> List[Tuple]:
+        """The errors this code can correct, as tuples of the flipped bit positions."""
+        return self._correctable_errors
+
+    @correctable_errors.setter
+    def correctable_errors(self, value: List[Tuple]) -> None:
+        self._correctable_errors = value
+        self._layouts.clear()
+
+    @property
+    def detectable_errors(self) -> List[Tuple]:
+        """The errors this code can detect but not correct, as tuples of the flipped bit positions."""
+        return self._detectable_errors
+
+    @detectable_errors.setter
+    def detectable_errors(self, value: List[Tuple]) -> None:
+        self._detectable_errors = value
+        self._layouts.clear()
+
+    def _cached_layout(self, name: str, calculate: Callable[[], Any]) -> Any:
+        """Get a layout derived from the matrices, calculating it only when it is not cached yet"""
+        if name not in self._layouts:
+            self._layouts[name] = calculate()
+        return self._layouts[name]
+
+    def encoder_inputs(self) -> List[List[int]]:
+        """
+        Determine the data bits that are combined into each encoded bit, using the columns of the generator matrix.
+
+        :return: list of data bit indices for each encoded bit
+        """
+        return self._cached_layout("encoder_inputs", lambda: nonzero_per_row(self.generator_matrix.T))
+
+    def syndrome_inputs(self) -> List[List[int]]:
+        """
+        Determine the encoded bits that are combined into each syndrome bit, using the rows of the parity-check matrix.
+
+        :return: list of encoded bit indices for each syndrome bit
+        """
+        return self._cached_layout("syndrome_inputs", lambda: nonzero_per_row(self.parity_check_matrix))
+
+    def parity_check_columns(self) -> NDArray:
+        """
+        Pack each column of the parity-check matrix into an integer, where bit i corresponds to row i. The syndrome of
+        an error is the exclusive-or of the packed columns of the flipped bits.
+
+        :return: uint64 array with the packed value of each column
+        :raises ValueError: if the code has more than 64 parity bits
+        """
+        def calculate():
+            if self.parity_bits > 64:
+                raise ValueError(f"Unable to pack columns of {self.parity_bits} parity bits into 64-bit integers")
+
+            weights = np.left_shift(1, np.arange(self.parity_bits, dtype=np.uint64), dtype=np.uint64)
+            return (self.parity_check_matrix.astype(np.uint64) * weights[:, np.newaxis]).sum(axis=0, dtype=np.uint64)
+
+        return self._cached_layout("parity_check_columns", calculate)
+
+    def flip_masks(self) -> Dict[int, int]:
+        """
+        Determine the bits to flip for the syndrome of each correctable error, using the parity-check matrix.
+
+        :return: mapping from syndrome value to the mask of encoded bits to flip, in the order of the correctable errors
+        """
+        def calculate():
+            # Concatenate the bits of all correctable errors, and find where each error starts
+            error_lengths = np.array([len(error) for error in self.correctable_errors], dtype=np.intp)
+            error_bits = np.fromiter(itertools.chain.from_iterable(self.correctable_errors), dtype=np.intp,
+                                     count=error_lengths.sum())
+            error_starts = np.cumsum(error_lengths) - error_lengths
+
+            # The syndrome of each error is the exclusive-or of the packed columns of its error bits
+            columns = self.parity_check_columns()
+            syndromes = np.bitwise_xor.reduceat(columns[error_bits], error_starts)
+
+            # The mask of each error is the or of its bits, as Python integers since the code can exceed 64 bits
+            error_masks = np.array(self.correctable_error_masks(), dtype=object)
+
+            # Combine the masks of all errors with the same syndrome, keeping the order of the first occurrence
+            unique_syndromes, first, inverse = np.unique(syndromes, return_index=True, return_inverse=True)
+            unique_masks = np.zeros(len(unique_syndromes), dtype=object)
+            np.bitwise_or.at(unique_masks, inverse, error_masks)
+
+            order = np.argsort(first)
+            return dict(zip(unique_syndromes[order].tolist(), unique_masks[order].tolist()))
+
+        return self._cached_layout("flip_masks", calculate)
+
+    def correctable_error_masks(self) -> List[int]:
+        """
+        Determine the mask of encoded bits flipped by each correctable error.
+
+        :return: mask of each error, in the order of the correctable errors
+        """
+        return self._cached_layout("correctable_error_masks", lambda: or_reduce_bits_each(self.correctable_errors))
+
+    def detectable_error_masks(self) -> List[int]:
+        """
+        Determine the mask of encoded bits flipped by each detectable error.
+
+        :return: mask of each error, in the order of the detectable errors
+        """
+        return self._cached_layout("detectable_error_masks", lambda: or_reduce_bits_each(self.detectable_errors))
+
+    def data_bit_positions(self) -> List[int]:
+        """
+        Determine the encoded bit which directly contains each data bit, using the generator matrix.
+
+        :return: encoded bit index for each data bit
+        :raises ValueError: if a data bit is not directly mapped to an encoded bit
+        """
+        def calculate():
+            # Columns with a single one directly map a data bit, the first of these columns is used for each data bit
+            identity_cols = np.flatnonzero(self.generator_matrix.sum(axis=0) == 1)
+            identity_rows = self.generator_matrix[:, identity_cols].argmax(axis=0)
+            bits, first = np.unique(identity_rows, return_index=True)
+
+            missing = np.setdiff1d(np.arange(self.data_bits), bits)
+            if len(missing) > 0:
+                raise ValueError(f"Generator matrix does not directly map data bit {missing[0]} to an encoded bit")
+            return identity_cols[first].tolist()
+
+        return self._cached_layout("data_bit_positions", calculate)
+
     @abc.abstractmethod
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
         """
@@ -59,35 +214,62 @@ class GenericCode(abc.ABC):
         Generate the parity-check and generator matrices for this error correction code, with possible caching.
 
         This method provides the same functionality as ``generate_matrices`` with the additional support for caching
-        the generated matrices to allow for faster runtime. If a cached version of the parity-check matrix with the
-        specified number of data bits exist, it will be automatically loaded and the expensive computation of the
-        parity-check matrix will be skipped. Otherwise, the parity-check matrix will be generated like normal using
-        ``generate_matrices``. This matrix will then be automatically cached for the next run.
+        the generated matrices to allow for faster runtime. If cached versions of the parity-check and generator
+        matrix with the specified number of data and parity bits exist, they will be automatically loaded and the
+        expensive computation of the matrices will be skipped. Otherwise, the matrices will be generated like normal
+        using ``generate_matrices``. These matrices will then be automatically cached for the next run. Both matrices
+        are cached, such that a loaded code uses exactly the same generator matrix as a freshly generated code.
+
+        The matrices are also kept in memory, such that creating the same code again in the same process does not
+        even need to load the file.
 
-        If the ``force_rebuild`` option is enabled, the parity-check matrix will always be calculated from scratch
-        disregarding the cached version, which might be available.
+        If the ``force_rebuild`` option is enabled, the matrices will always be calculated from scratch disregarding
+        the cached version, which might be available.
 
         :param timeout:
         :param force_rebuild:
         :return:
         """
-        # Determine the file name and path
-        file_name = f"{self.__class__.__name__}_{self.data_bits}.npy"
+        # Matrices generated or loaded earlier in this process are reused without touching the file system
+        cache_key = (self.__class__.__name__, self.data_bits, self.parity_bits)
+        if not force_rebuild and cache_key in _matrix_cache:
+            logging.info("Reusing parity-check and generator matrix from this process")
+            parity_check_matrix, generator_matrix = _matrix_cache[cache_key]
+            self.parity_check_matrix = parity_check_matrix.copy()
+            self.generator_matrix = generator_matrix.copy()
+            return
+
+        # Determine the file name and path, the number of parity bits is included as it determines the matrix size
+        file_name = f"{self.__class__.__name__}_{self.data_bits}_{self.parity_bits}.npz"
         file_path = Path(f"~/.cache/memory-controller-generator/{file_name}").expanduser()
 
-        # Check if the matrix should be generated or loaded from file
+        # Check if the matrices should be loaded from file
+        parity_check_matrix = None
+        generator_matrix = None
         if not force_rebuild and file_path.exists():
-            logging.info(f"Loading parity-check matrix from '{file_path}'")
-            # Load the parity-check matrix from the file
-            self.parity_check_matrix = np.load(file_path)
-            # Calculate the corresponding generator matrix from the parity-check matrix
-            self.generator_matrix = generator_matrix_from_parity_check_matrix(self.parity_check_matrix)
+            logging.info(f"Loading parity-check and generator matrix from '{file_path}'")
+            # Load the matrices from the file
+            with np.load(file_path) as cached:
+                if {"parity_check_matrix", "generator_matrix"} <= set(cached.files):
+                    parity_check_matrix = cached["parity_check_matrix"]
+                    generator_matrix = cached["generator_matrix"]
+
+            if parity_check_matrix is None or parity_check_matrix.shape != (self.parity_bits, self.total_bits) \
+                    or generator_matrix.shape != (self.data_bits, self.total_bits):
+                logging.warning(f"Ignoring cached matrices in '{file_path}'")
+                parity_check_matrix = None
+
+        if parity_check_matrix is not None:
+            self.parity_check_matrix = parity_check_matrix
+            self.generator_matrix = generator_matrix
         else:
             self.generate_matrices(timeout=timeout)
             # Make sure the parent folders exist
             file_path.parent.mkdir(parents=True, exist_ok=True)
-            # Save the parity-check matrix to the file
-            np.save(file_path, self.parity_check_matrix)
+            # Save both matrices to the file
+            np.savez(file_path, parity_check_matrix=self.parity_check_matrix, generator_matrix=self.generator_matrix)
+
+        _matrix_cache[cache_key] = (self.parity_check_matrix.copy(), self.generator_matrix.copy())
 
     def encoder(self) -> "GenericEncoder":
         """
@@ -160,14 +342,13 @@ class GenericEncoder(Elaboratable):
         """Elaborate the module implementation"""
         m = Module()
 
-        # Calculate each encoded bit from the specified column of the generator matrix
-        for col_idx, col in enumerate(self.code.generator_matrix.T):
-            input_parts = []
-            for i, select in enumerate(col):
-                if select:
-                    input_parts.append(self.data_in[i])
-
-            m.d.comb += self.enc_out[col_idx].eq(xor_reduce(input_parts))
+        # Calculate each encoded bit from the specified column of the generator matrix, slicing every input bit once
+        data_in = [self.data_in[i] for i in range(self.code.data_bits)]
+        enc_out = self.enc_out
+        m.d.comb += [
+            enc_out[col_idx].eq(xor_reduce([data_in[i] for i in inputs]))
+            for col_idx, inputs in enumerate(self.code.encoder_inputs())
+        ]
 
         return m
 
@@ -218,13 +399,11 @@ class GenericDecoder(Elaboratable):
         if self.code.parity_bits > 0:
             # Calculate the syndrome for this parity-check matrix
             syndrome_signal = Signal(unsigned(self.code.parity_bits))
-            for row_idx, row in enumerate(self.code.parity_check_matrix):
-                input_parts = []
-                for i, select in enumerate(row):
-                    if select:
-                        input_parts.append(self.enc_in[i])
-
-                m.d.comb += syndrome_signal[row_idx].eq(xor_reduce(input_parts))
+            enc_in = [self.enc_in[i] for i in range(self.code.total_bits)]
+            m.d.comb += [
+                syndrome_signal[row_idx].eq(xor_reduce([enc_in[i] for i in inputs]))
+                for row_idx, inputs in enumerate(self.code.syndrome_inputs())
+            ]
 
             # Send the calculated syndrome to the flips calculator
             m.d.comb += flip_calculator.syndrome.eq(syndrome_signal)
@@ -249,16 +428,7 @@ class GenericDecoder(Elaboratable):
             ]
 
         # Connect the correct input bits to the output
-        for bit in range(self.code.data_bits):
-            for col_idx, col in enumerate(self.code.generator_matrix.T):
-                match_vec = np.zeros((self.code.data_bits,))
-                match_vec[bit] = 1
-
-                if np.array_equal(col, match_vec):
-                    m.d.comb += self.data_out[bit].eq(self.enc_out[col_idx])
-                    break
-            else:
-                raise ValueError(f"Generator matrix does not directly map data bit {bit} to an encoded bit")
+        m.d.comb += self.data_out.eq(Cat(self.enc_out[col_idx] for col_idx in self.code.data_bit_positions()))
 
         return m
 
@@ -273,8 +443,8 @@ class GenericFlipCalculator(Elaboratable):
 
     This class provides the calculation of which bits to flip based on the supplied syndrome signal. Calculating when
     to flip a bit can be done using the parity-check matrix and a list of correctable errors. First, the syndrome
-    value for each correctable error is calculated. Second, for each bit we match all syndromes that require the bit
-    to flip.
+    value for each correctable error is calculated. Second, a single switch over the syndrome selects the bits to
+    flip for each of these syndromes, such that every syndrome is only matched once for all bits.
 
     This implementation take the naive approach of completely matching the syndrome for each error. While this
     approach will always work for codes with a valid parity-check matrix and respective correctable error list,
@@ -294,21 +464,13 @@ class GenericFlipCalculator(Elaboratable):
         """Elaborate the module implementation"""
         m = Module()
 
-        # Calculate which syndromes cause a bit to flip
-        flip_bit_syndromes: List[List[int]] = [[] for _ in range(self.code.total_bits)]
-        for error in self.code.correctable_errors:
-            # Calculate the linear combination of the error bit columns in the parity-check matrix.
-            error_syn = np.zeros((self.code.parity_bits,), dtype=int)
-            for i in error:
-                error_syn ^= self.code.parity_check_matrix.T[i]
-
-            for i in error:
-                flip_bit_syndromes[i].append(np_array_to_value(error_syn))
-
-        # Calculate which bits to flip to correct the error(s)
-        for bit, syndromes in enumerate(flip_bit_syndromes):
-            flip = or_reduce(self.syndrome == syndrome for syndrome in syndromes)
-            m.d.comb += self.flips[bit].eq(flip)
+        # Select which bits to flip to correct the error(s), no bits are flipped for other syndromes
+        with m.Switch(self.syndrome):
+            for syndrome, mask in self.code.flip_masks().items():
+                with m.Case(syndrome):
+                    m.d.comb += self.flips.eq(mask)
+            with m.Default():
+                m.d.comb += self.flips.eq(0)
 
         return m
 
@@ -3,9 +3,45 @@ from typing import Optional
 
 import numpy as np
 from amaranth import *
+from numpy.typing import NDArray
 
-from . import GenericCode, GenericErrorCalculator
-from ..util.matrix import generator_matrix_from_parity_check_matrix
+from . import GenericCode, GenericErrorCalculator, GenericFlipCalculator
+
+
+def hamming_parity_bits(data_bits: int) -> int:
+    """
+    Determine the number of parity bits of a Hamming code for the specified number of data bits.
+
+    This is the smallest m for which 2^m - m - 1 >= data_bits. Since 2^m has to exceed the number of data bits,
+    the search starts at the bit length of the number of data bits, and takes at most a few steps from there.
+
+    :param data_bits: number of data bits
+    :return: number of parity bits
+    """
+    parity_bits = data_bits.bit_length()
+    while 2 ** parity_bits - parity_bits - 1 < data_bits:
+        parity_bits += 1
+    return parity_bits
+
+
+def hamming_generator_matrix(parity_check_matrix: NDArray) -> NDArray:
+    """
+    Create the generator matrix for the parity-check matrix of a standard Hamming code.
+
+    The columns at the powers of two each contain a single one, so these columns hold the parity bits and the
+    remaining columns hold the data bits directly. This avoids converting the parity-check matrix to systematic form.
+
+    :param parity_check_matrix: parity-check matrix with increasing binary values in the columns
+    :return: matching generator matrix
+    """
+    parity_bits, total_bits = parity_check_matrix.shape
+    parity_cols = (1 << np.arange(parity_bits)) - 1
+    data_cols = np.setdiff1d(np.arange(total_bits), parity_cols)
+
+    generator_matrix = np.zeros((len(data_cols), total_bits), dtype=np.uint8)
+    generator_matrix[np.arange(len(data_cols)), data_cols] = 1
+    generator_matrix[:, parity_cols] = parity_check_matrix[:, data_cols].T
+    return generator_matrix
 
 
 class HammingCode(GenericCode):
@@ -19,28 +55,25 @@ class HammingCode(GenericCode):
 
     def __init__(self, data_bits: int) -> None:
         # Determine the number of parity bits required for the specified number of data bits
-        parity_bits = 0
-        for m in itertools.count():
-            if 2 ** m - m - 1 >= data_bits:
-                parity_bits = m
-                break
-
-        super().__init__(data_bits=data_bits, parity_bits=parity_bits)
+        super().__init__(data_bits=data_bits, parity_bits=hamming_parity_bits(data_bits))
 
         # Add the list of correctable errors
         for i in range(self.total_bits):
             self.correctable_errors.append((i,))
 
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
-        self.parity_check_matrix = np.zeros((self.parity_bits, self.total_bits), dtype=int)
-
         # Set the columns of the parity-check matrix to increasing binary values
-        for col_idx, col in enumerate(self.parity_check_matrix.T):
-            for bit in range(self.parity_bits):
-                col[bit] = 1 if (col_idx + 1) & (1 << bit) else 0
+        values = np.arange(1, self.total_bits + 1)
+        self.parity_check_matrix = ((values >> np.arange(self.parity_bits)[:, np.newaxis]) & 1).astype(np.uint8)
 
         # Create the generator matrix from the parity-check matrix
-        self.generator_matrix = generator_matrix_from_parity_check_matrix(self.parity_check_matrix)
+        self.generator_matrix = hamming_generator_matrix(self.parity_check_matrix)
+
+    def flip_calculator(self) -> "HammingFlipCalculator":
+        if self.parity_check_matrix is None:
+            raise ValueError("Parity-check matrix is None")
+
+        return HammingFlipCalculator(self)
 
 
 class ExtendedHammingCode(GenericCode):
@@ -56,43 +89,81 @@ class ExtendedHammingCode(GenericCode):
     def __init__(self, data_bits: int) -> None:
         # Calculate the number of parity bits with the same method as the Hamming code, but add one for the extra
         # parity bit.
-        parity_bits = 0
-        for m in itertools.count():
-            if 2 ** m - m - 1 >= data_bits:
-                parity_bits = m
-                break
-        parity_bits += 1
-
-        super().__init__(data_bits=data_bits, parity_bits=parity_bits)
+        super().__init__(data_bits=data_bits, parity_bits=hamming_parity_bits(data_bits) + 1)
 
         # Add the list of correctable errors
         for i in range(self.total_bits):
             self.correctable_errors.append((i,))
 
         # Add the list of detectable errors
-        for i in range(self.total_bits):
-            for j in range(i + 1, self.total_bits):
-                self.detectable_errors.append((i, j))
+        self.detectable_errors.extend(itertools.combinations(range(self.total_bits), 2))
 
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
-        self.parity_check_matrix = np.zeros((self.parity_bits, self.total_bits), dtype=int)
+        parity_check_matrix = np.zeros((self.parity_bits, self.total_bits), dtype=np.uint8)
 
         # Set the columns of the parity-check matrix to increasing binary values
         # For the extended hamming code we ignore the last row and column
-        for col_idx, col in enumerate(self.parity_check_matrix.T[:-1]):
-            for bit in range(self.parity_bits - 1):
-                col[bit] = 1 if (col_idx + 1) & (1 << bit) else 0
+        values = np.arange(1, self.total_bits)
+        parity_check_matrix[:-1, :-1] = (values >> np.arange(self.parity_bits - 1)[:, np.newaxis]) & 1
 
         # Fill the bottom row with ones
-        self.parity_check_matrix[-1] = np.ones((self.total_bits,))
+        parity_check_matrix[-1] = 1
 
-        # Create the generator matrix from the parity-check matrix
-        self.generator_matrix = generator_matrix_from_parity_check_matrix(self.parity_check_matrix)
+        self.parity_check_matrix = parity_check_matrix
+
+        # Create the generator matrix of the standard Hamming code, and add the overall parity bit in the last column
+        generator_matrix = np.zeros((self.data_bits, self.total_bits), dtype=np.uint8)
+        generator_matrix[:, :-1] = hamming_generator_matrix(parity_check_matrix[:-1, :-1])
+        generator_matrix[:, -1] = generator_matrix[:, :-1].sum(axis=1) % 2
+        self.generator_matrix = generator_matrix
+
+    def flip_calculator(self) -> "ExtendedHammingFlipCalculator":
+        if self.parity_check_matrix is None:
+            raise ValueError("Parity-check matrix is None")
+
+        return ExtendedHammingFlipCalculator(self)
 
     def error_calculator(self) -> "ExtendedHammingErrorCalculator":
         return ExtendedHammingErrorCalculator(self)
 
 
+class HammingFlipCalculator(GenericFlipCalculator):
+    """
+    Implementation of the flip calculation for Hamming codes.
+
+    The syndrome of a single bit error in a Hamming code is the index of the flipped bit plus one. Therefore,
+    the bit to flip can be selected by shifting a one by the syndrome, without matching the syndrome of each error.
+    Syndromes outside the encoded bits shift the one out, such that no bits are flipped.
+    """
+
+    def elaborate(self, platform) -> Module:
+        """Elaborate the module implementation"""
+        m = Module()
+        m.d.comb += self.flips.eq((Const(1, self.code.total_bits + 1) << self.syndrome)[1:])
+        return m
+
+
+class ExtendedHammingFlipCalculator(GenericFlipCalculator):
+    """
+    Implementation of the flip calculation for extended Hamming codes.
+
+    Single bit errors are the only errors that set the last syndrome bit. The other syndrome bits form the syndrome
+    of the inner Hamming code, which is zero for an error in the extra parity bit at the end, and the index of the
+    flipped bit plus one otherwise.
+    """
+
+    def elaborate(self, platform) -> Module:
+        """Elaborate the module implementation"""
+        m = Module()
+
+        # Select the flipped bit from the inner syndrome, moving a zero syndrome to the extra parity bit
+        selected = Const(1, self.code.total_bits) << self.syndrome[:-1]
+        rotated = Cat(selected[1:self.code.total_bits], selected[0])
+
+        m.d.comb += self.flips.eq(Mux(self.syndrome[-1], rotated, 0))
+        return m
+
+
 class ExtendedHammingErrorCalculator(GenericErrorCalculator):
     """
     Implementation of the error calculation for extended Hamming codes.
@@ -1,15 +1,16 @@
+import functools
 import itertools
 import logging
 import math
 import time
-from collections import Counter
-from typing import Optional
+from typing import Optional, List, Tuple
 
 import numpy as np
 from amaranth import *
 from numpy.typing import NDArray
 
 from . import GenericCode, GenericErrorCalculator
+from .hamming import hamming_parity_bits
 from ..util.matrix import generator_matrix_from_systematic
 
 
@@ -26,23 +27,16 @@ class HsiaoCode(GenericCode):
     """
 
     def __init__(self, data_bits: int) -> None:
-        # Determine the number of parity bits required for the specified number of data bits
-        parity_bits = 0
-        for m in itertools.count():
-            if 2 ** m - m - 1 >= data_bits:
-                parity_bits = m + 1
-                break
-
-        super().__init__(data_bits=data_bits, parity_bits=parity_bits)
+        # Determine the number of parity bits required for the specified number of data bits, which is one more than
+        # for a Hamming code
+        super().__init__(data_bits=data_bits, parity_bits=hamming_parity_bits(data_bits) + 1)
 
         # All single bit errors are correctable
         for i in range(self.total_bits):
             self.correctable_errors.append((i,))
 
         # All two bit errors are detectable
-        for i in range(self.total_bits):
-            for j in range(i + 1, self.total_bits):
-                self.detectable_errors.append((i, j))
+        self.detectable_errors.extend(itertools.combinations(range(self.total_bits), 2))
 
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
         # Find all columns which are always used
@@ -62,55 +56,105 @@ class HsiaoCode(GenericCode):
                 break
             num_ones += 2
 
+        if columns_needed == 0:
+            # All columns are fixed, so there is nothing to search for
+            lowest_candidate = list(fixed_columns)
+        else:
+            lowest_candidate = self._search_flexible_columns(fixed_columns, num_ones, columns_needed, timeout)
+
+        # Extend the candidate with the identity columns
+        lowest_candidate.extend(itertools.combinations(range(self.parity_bits), 1))
+        # Build the parity-check matrix from the column definitions, by setting all ones at once
+        column_weights = [len(set_rows) for set_rows in lowest_candidate]
+        rows = np.fromiter(itertools.chain(*lowest_candidate), dtype=np.intp, count=sum(column_weights))
+        cols = np.repeat(np.arange(len(lowest_candidate)), column_weights)
+        parity_check_matrix = np.zeros((self.parity_bits, self.total_bits), dtype=np.uint8)
+        parity_check_matrix[rows, cols] = 1
+        self.parity_check_matrix = parity_check_matrix
+
+        # Create the generator matrix from the parity-check matrix, in this case the parity-check matrix is already
+        # in systematic form, so no extra work is required
+        self.generator_matrix = generator_matrix_from_systematic(self.parity_check_matrix)
+
+    def _search_flexible_columns(self, fixed_columns: List[Tuple[int, ...]], num_ones: int, columns_needed: int,
+                                 timeout: Optional[float]) -> List[Tuple[int, ...]]:
+        """
+        Search for the flexible columns that, together with the fixed columns, result in the most balanced rows.
+
+        :param fixed_columns: columns which are always used, as tuples of set rows
+        :param num_ones: number of ones in each flexible column
+        :param columns_needed: number of flexible columns to select
+        :param timeout: Optional timeout in seconds
+        :return: fixed and selected flexible columns of the best candidate
+        """
         # Create a list of possible additional columns
-        flexible_columns = itertools.combinations(range(self.parity_bits), num_ones)
-        # Create an iterator over all possible options
-        flexible_column_combinations = itertools.combinations(flexible_columns, columns_needed)
+        flexible_columns = list(itertools.combinations(range(self.parity_bits), num_ones))
+
+        # Count the number of ones in each row for the fixed columns
+        fixed_rows = np.fromiter(itertools.chain(*fixed_columns), dtype=np.intp)
+        fixed_row_weights = np.bincount(fixed_rows, minlength=self.parity_bits).tolist()
+
+        # No candidate can have a maximum row weight below the average row weight
+        total_ones = sum(fixed_row_weights) + columns_needed * num_ones
+        bound_max_row_weight = math.ceil(total_ones / self.parity_bits)
 
         # If no timeout is set, assume a timeout of 24 hours
         if timeout is None:
             timeout = 3600 * 24
-        timeout_time = time.time() + timeout
+        timeout_time = time.perf_counter() + timeout
 
         # Initialise the lowest maximum row weight as the number of bits, as this is the maximum weight of a row
         lowest_max_row_weight = self.total_bits
         lowest_candidate = None
 
-        # Search for the candidate with the lowest difference in row weight
-        for candidate_columns in flexible_column_combinations:
-            # Build the complete column list
-            candidate = fixed_columns + list(candidate_columns)
-            # Count the number of ones in each row
-            c = Counter(itertools.chain(*candidate))
-
-            # Calculate the minimum and maximum weight of the rows
-            max_row_weight = max(c.values())
-            min_row_weight = min(c.values())
-
-            # If this candidate has the lowest maximum row weight, store it
-            if max_row_weight < lowest_max_row_weight:
-                lowest_max_row_weight = max_row_weight
-                lowest_candidate = candidate
-
-                # If the difference between the lowest weight and highest weight rows is one or zero, the rows of the
-                # matrix are completely balanced
-                if max_row_weight - min_row_weight <= 1:
-                    break
+        # Search for the candidate with the lowest difference in row weight, by selecting the flexible columns
+        # depth-first in the same order as itertools.combinations. Row weights only increase when adding columns,
+        # so a partial selection is pruned once its maximum row weight is no longer lower than the best candidate.
+        selected = []
+        row_weights_stack = [fixed_row_weights]
+        next_index = 0
+        for step in itertools.count(1):
+            # Check the timeout once every few thousand steps, as reading the clock is slow compared to a single
+            # step. The search always continues until a first candidate is found, even when the timeout has passed.
+            if step % 4096 == 0 and lowest_candidate is not None and time.perf_counter() > timeout_time:
+                break
 
-            if time.time() > timeout_time:
+            if len(selected) == columns_needed:
+                row_weights = row_weights_stack[-1]
+
+                # Calculate the minimum and maximum weight of the rows, ignoring rows without any ones
+                max_row_weight = max(row_weights, default=0)
+                min_row_weight = min((weight for weight in row_weights if weight > 0), default=0)
+
+                # If this candidate has the lowest maximum row weight, store it
+                if max_row_weight < lowest_max_row_weight:
+                    lowest_max_row_weight = max_row_weight
+                    # Build the complete column list
+                    lowest_candidate = fixed_columns + [flexible_columns[i] for i in selected]
+
+                    # If the difference between the lowest weight and highest weight rows is one or zero, the rows of
+                    # the matrix are completely balanced. Otherwise, stop when the lower bound has been reached.
+                    if max_row_weight - min_row_weight <= 1 or max_row_weight <= bound_max_row_weight:
+                        break
+            elif next_index <= len(flexible_columns) - (columns_needed - len(selected)):
+                # Try to add the next flexible column to the selection
+                row_weights = list(row_weights_stack[-1])
+                for row in flexible_columns[next_index]:
+                    row_weights[row] += 1
+
+                if max(row_weights) < lowest_max_row_weight:
+                    selected.append(next_index)
+                    row_weights_stack.append(row_weights)
+                next_index += 1
+                continue
+
+            # All selections with this prefix have been tried, so continue after the last selected column
+            if not selected:
                 break
+            next_index = selected.pop() + 1
+            row_weights_stack.pop()
 
-        # Extend the candidate with the identity columns
-        lowest_candidate.extend(itertools.combinations(range(self.parity_bits), 1))
-        # Build the parity-check matrix from the column definitions
-        self.parity_check_matrix = np.zeros((self.parity_bits, self.total_bits), dtype=int)
-        for col, set_rows in enumerate(lowest_candidate):
-            for row in set_rows:
-                self.parity_check_matrix[row, col] = 1
-
-        # Create the generator matrix from the parity-check matrix, in this case the parity-check matrix is already
-        # in systematic form, so no extra work is required
-        self.generator_matrix = generator_matrix_from_systematic(self.parity_check_matrix)
+        return lowest_candidate
 
     def error_calculator(self) -> "HsiaoErrorCalculator":
         return HsiaoErrorCalculator(self)
@@ -148,14 +192,17 @@ class HsiaoConstructedCode(HsiaoCode):
     """
 
     def generate_matrices(self, timeout: Optional[float] = None) -> None:
+        # Calculate the number of possible columns of each weight once
+        binomials = [math.comb(self.parity_bits, weight) for weight in range(self.parity_bits + 1)]
+
         # Calculate the weight of the highest weight columns
         max_weight = 1
         prev_total = 0
-        total = math.comb(self.parity_bits, max_weight)
+        total = binomials[max_weight]
         while self.total_bits > total:
             max_weight += 2
             prev_total = total
-            total += math.comb(self.parity_bits, max_weight)
+            total += binomials[max_weight]
 
         # Calculate the number of max weight columns
         max_weight_columns = self.total_bits - prev_total
@@ -164,11 +211,11 @@ class HsiaoConstructedCode(HsiaoCode):
         parts = []
         # First build all sub-matrices where all columns are present
         for weight in range(3, max_weight, 2):
-            parts.append(self.delta(self.parity_bits, weight, math.comb(self.parity_bits, weight)))
+            parts.append(self.delta(self.parity_bits, weight, binomials[weight]))
         # Then append the smaller final sub-matrix
         parts.append(self.delta(self.parity_bits, max_weight, max_weight_columns))
         # Finally, append the identity matrix at the end
-        parts.append(np.identity(self.parity_bits, dtype=int))
+        parts.append(np.identity(self.parity_bits, dtype=np.uint8))
 
         # Build the parity-check matrix by stacking the parts
         self.parity_check_matrix = np.hstack(parts)
@@ -186,44 +233,54 @@ class HsiaoConstructedCode(HsiaoCode):
         matrix. If the parameters specified do not result in an ending state, the algorithm will build the required
         matrix using two recursive calls with smaller parameters.
 
+        The sub-matrices are memoized, as the recursion and the different weights in ``generate_matrices`` request
+        the same sub-matrices many times.
+
         :param rows: Rows in the resulting matrix
         :param weight: Weight of each column in the matrix
         :param columns: Number of columns in the matrix
         :return: Delta matrix with the specified parameters
         """
+        # Return a copy, such that the caller is free to modify the memoized matrix
+        return HsiaoConstructedCode._delta(rows, weight, columns).copy()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _delta(rows: int, weight: int, columns: int) -> NDArray:
+        """Compute the delta sub-matrix, the result is memoized and should not be modified"""
         if columns == 0:
             # No columns, so return a zero column matrix
             logging.debug(f"m==0 >> R: {rows}, w: {weight}")
-            return np.zeros((rows, 0), dtype=int)
+            return np.zeros((rows, 0), dtype=np.uint8)
         elif weight == 0:
             # Single column with zero weight
             logging.debug(f"J==0 >> R: {rows}, m: {columns}")
             assert columns == 1
-            return np.zeros((rows, 1), dtype=int)
+            return np.zeros((rows, 1), dtype=np.uint8)
         elif weight == rows:
             # Single column with maximum weight
             logging.debug(f"J==R >> R: {rows}, m: {columns}")
             assert columns == 1
-            return np.ones((rows, 1), dtype=int)
+            return np.ones((rows, 1), dtype=np.uint8)
         elif columns == 1:
             # Single column of specified weight, fill the first n rows with 1, where n = weight
             logging.debug(f"m==1 >> R: {rows}, J: {weight}")
-            mat = np.zeros((rows, 1), dtype=int)
+            mat = np.zeros((rows, 1), dtype=np.uint8)
             mat[0:weight] = 1
             return mat
         elif weight == 1:
             # Weight is 1, so identity matrix padded with zero rows
             logging.debug(f"J==1 >> R: {rows}, m: {columns}")
             assert rows >= columns
-            ident = np.identity(columns, dtype=int)
-            zeros = np.zeros((rows - columns, columns), dtype=int)
+            ident = np.identity(columns, dtype=np.uint8)
+            zeros = np.zeros((rows - columns, columns), dtype=np.uint8)
             return np.vstack((ident, zeros))
         elif weight == rows - 1:
             # Weight is rows - 1, so all ones with identity subtracted from the bottom rows
             logging.debug(f"J==R-1 >> R: {rows}, m: {columns}")
             assert rows >= columns
-            ones = np.ones((rows - columns, columns), dtype=int)
-            ident = 1 - np.identity(columns, dtype=int)
+            ones = np.ones((rows - columns, columns), dtype=np.uint8)
+            ident = 1 - np.identity(columns, dtype=np.uint8)
             return np.vstack((ones, ident))
         else:
             # General case that requires splitting
@@ -234,8 +291,8 @@ class HsiaoConstructedCode(HsiaoCode):
             # Recursively calculate sub-parts of the matrix
             m1 = math.ceil((columns * weight) / rows)
             logging.debug(f"R: {rows}, J:{weight}, m: {columns}, m1: {m1}, m2: {columns - m1}")
-            delta1 = HsiaoConstructedCode.delta(rows - 1, weight - 1, m1)
-            delta2 = HsiaoConstructedCode.delta(rows - 1, weight, columns - m1)
+            delta1 = HsiaoConstructedCode._delta(rows - 1, weight - 1, m1)
+            delta2 = HsiaoConstructedCode._delta(rows - 1, weight, columns - m1)
 
             # Calculate the shifting of rows required in delta2
             r1 = ((weight - 1) * m1) % (rows - 1)
@@ -255,8 +312,8 @@ class HsiaoConstructedCode(HsiaoCode):
             delta2_prime = delta2[order]
 
             # Create the top row of the resulting matrix
-            ones = np.ones((1, m1), dtype=int)
-            zeros = np.zeros((1, columns - m1), dtype=int)
+            ones = np.ones((1, m1), dtype=np.uint8)
+            zeros = np.zeros((1, columns - m1), dtype=np.uint8)
             top = np.hstack((ones, zeros))
 
             # Create the bottom sub-matrix of the resulting matrix
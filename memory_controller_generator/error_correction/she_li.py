@@ -26,7 +26,7 @@ class SheLiCode(BoolectorCode):
     Transactions on Nuclear Science 59 (1 PART 2), 205–210. https://doi.org/10.1109/TNS.2011.2176513
     """
 
-    def __init__(self, data_bits):
+    def __init__(self, data_bits, workers: int = 1):
         # Calculate the number of parity bits using the equation from the paper: k + c - 1 <= 2**(c - 2)
         parity_bits = 0
         for m in itertools.count():
@@ -34,7 +34,7 @@ class SheLiCode(BoolectorCode):
                 parity_bits = m
                 break
 
-        super().__init__(data_bits=data_bits, parity_bits=parity_bits)
+        super().__init__(data_bits=data_bits, parity_bits=parity_bits, workers=workers)
 
         # Mark single bit errors as correctable
         for i in range(self.total_bits):
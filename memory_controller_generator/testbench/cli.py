@@ -0,0 +1,86 @@
+import argparse
+import logging
+import time
+from typing import Type, TYPE_CHECKING
+
+import numpy as np
+from amaranth.cli import main_parser
+
+import memory_controller_generator.error_correction
+from ..error_correction import GenericCode
+
+if TYPE_CHECKING:
+    from ..controller.generic import GenericController
+
+
+def testbench_parser(controller: bool = False) -> argparse.ArgumentParser:
+    """
+    Build the commandline argument parser shared by the testbenches.
+
+    :param controller: add an option to select the memory controller
+    :return: Amaranth main parser extended with the code selection options
+    """
+    parser = main_parser()
+    parser.add_argument("-c", "--code", dest="code_name", default="HammingCode")
+    if controller:
+        parser.add_argument("-x", "--controller", dest="controller_name", default="BasicController")
+    parser.add_argument("-b", "--bits", dest="data_bits", default=32, type=int)
+    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0)
+    parser.add_argument("-t", "--timeout", dest="timeout", default=30.0, type=float)
+    parser.add_argument("-f", "--force-rebuild", dest="force_rebuild", default=False, const=True, action="store_const")
+    return parser
+
+
+def setup_logging(args: argparse.Namespace) -> None:
+    """Set the logging level based on the verbose-ness"""
+    np.set_printoptions(linewidth=200)
+
+    if args.verbose == 0:
+        log_level = logging.INFO
+    else:
+        log_level = logging.DEBUG
+    log_format = "%(levelname)8s: %(message)s"
+    logging.basicConfig(level=log_level, format=log_format)
+
+
+def controller_class_from_args(args: argparse.Namespace) -> Type["GenericController"]:
+    """
+    Dynamically select the controller based on the supplied name.
+
+    :param args: parsed commandline arguments
+    :return: selected controller class
+    :raises ValueError: if no controller with this name exists
+    """
+    # The controllers are only imported by the testbenches that select one
+    import memory_controller_generator.controller
+
+    if not hasattr(memory_controller_generator.controller, args.controller_name):
+        raise ValueError(f"Unknown controller: {args.controller_name}")
+    return getattr(memory_controller_generator.controller, args.controller_name)
+
+
+def code_from_args(args: argparse.Namespace) -> GenericCode:
+    """
+    Dynamically select the error correction code based on the supplied name, and generate its matrices.
+
+    :param args: parsed commandline arguments
+    :return: selected code with generated matrices
+    :raises ValueError: if no code with this name exists
+    """
+    if not hasattr(memory_controller_generator.error_correction, args.code_name):
+        raise ValueError(f"Unknown error correction code: {args.code_name}")
+    code_class = getattr(memory_controller_generator.error_correction, args.code_name)
+    code = code_class(data_bits=args.data_bits)
+
+    # Measure the time it takes to generate the matrices for this code
+    start = time.time()
+    code.generate_matrices_cached(timeout=args.timeout, force_rebuild=args.force_rebuild)
+    duration = 1000 * (time.time() - start)
+    logging.info(f"Matrix generation took {duration:.2f}ms")
+
+    # Log the parity-check matrix
+    logging.debug("Parity-check matrix:")
+    for row in code.parity_check_matrix:
+        logging.debug(f"  {row}")
+
+    return code
@@ -1,14 +1,9 @@
-import logging
-import time
-
-import numpy as np
 from amaranth import *
-from amaranth.cli import main_parser, main_runner
+from amaranth.cli import main_runner
 
-import memory_controller_generator.controller
-import memory_controller_generator.error_correction
 from ..controller.generic import GenericController
 from ..controller.record import MemoryRequestRecord, MemoryResponseRecord, SRAMInterfaceRecord
+from .cli import testbench_parser, setup_logging, controller_class_from_args, code_from_args
 
 
 class CXXRTLTestbench(Elaboratable):
@@ -17,9 +12,9 @@ class CXXRTLTestbench(Elaboratable):
         self.code = controller.code
         self.addr_bits = controller.addr_width
 
-        self.req = MemoryRequestRecord(self.addr_bits, code.data_bits)
-        self.rsp = MemoryResponseRecord(code.data_bits)
-        self.sram = SRAMInterfaceRecord(self.addr_bits, code.total_bits)
+        self.req = MemoryRequestRecord(self.addr_bits, self.code.data_bits)
+        self.rsp = MemoryResponseRecord(self.code.data_bits)
+        self.sram = SRAMInterfaceRecord(self.addr_bits, self.code.total_bits)
 
         self.mem = None
 
@@ -113,47 +108,11 @@ class CXXRTLRequester(Elaboratable):
 
 
 if __name__ == "__main__":
-    np.set_printoptions(linewidth=200)
-
-    # Build the commandline argument parser
-    parser = main_parser()
-    parser.add_argument("-c", "--code", dest="code_name", default="HammingCode")
-    parser.add_argument("-x", "--controller", dest="controller_name", default="BasicController")
-    parser.add_argument("-b", "--bits", dest="data_bits", default=32, type=int)
-    parser.add_argument("-v", "--verbose", dest="verbose", action="count", default=0)
-    parser.add_argument("-t", "--timeout", dest="timeout", default=30.0, type=float)
-    parser.add_argument("-f", "--force-rebuild", dest="force_rebuild", default=False, const=True, action="store_const")
+    parser = testbench_parser(controller=True)
     args = parser.parse_args()
-
-    # Set the logging level based on the verbose-ness
-    if args.verbose == 0:
-        log_level = logging.INFO
-    else:
-        log_level = logging.DEBUG
-    log_format = "%(levelname)8s: %(message)s"
-    logging.basicConfig(level=log_level, format=log_format)
-
-    # Dynamically select the error correction code based on the supplied name
-    if not hasattr(memory_controller_generator.error_correction, args.code_name):
-        raise ValueError(f"Unknown error correction code: {args.code_name}")
-    code_class = getattr(memory_controller_generator.error_correction, args.code_name)
-    code = code_class(data_bits=args.data_bits)
-
-    # Dynamically select the controller based on the supplied name
-    if not hasattr(memory_controller_generator.controller, args.controller_name):
-        raise ValueError(f"Unknown controller: {args.controller_name}")
-    controller_class = getattr(memory_controller_generator.controller, args.controller_name)
-
-    # Measure the time it takes to generate the matrices for this code
-    start = time.time()
-    code.generate_matrices_cached(timeout=args.timeout, force_rebuild=args.force_rebuild)
-    duration = 1000 * (time.time() - start)
-    logging.info(f"Matrix generation took {duration:.2f}ms")
-
-    # Log the parity-check matrix
-    logging.debug("Parity-check matrix:")
-    for row in code.parity_check_matrix:
-        logging.debug(f"  {row}")
+    setup_logging(args)
+    controller_class = controller_class_from_args(args)
+    code = code_from_args(args)
 
     # Create top module
     ctrl = controller_class(code=code, addr_width=13)
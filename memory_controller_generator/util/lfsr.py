@@ -0,0 +1,81 @@
+from typing import Tuple
+
+from amaranth import *
+
+from .reduce import xor_reduce
+
+# Taps of maximal length Fibonacci LFSRs for a given width (Xilinx XAPP052)
+LFSR_TAPS = {
+    2: (2, 1),
+    3: (3, 2),
+    4: (4, 3),
+    5: (5, 3),
+    6: (6, 5),
+    7: (7, 6),
+    8: (8, 6, 5, 4),
+    9: (9, 5),
+    10: (10, 7),
+    11: (11, 9),
+    12: (12, 6, 4, 1),
+    13: (13, 4, 3, 1),
+    14: (14, 5, 3, 1),
+    15: (15, 14),
+    16: (16, 15, 13, 4),
+    17: (17, 14),
+    18: (18, 11),
+    19: (19, 6, 2, 1),
+    20: (20, 17),
+    21: (21, 19),
+    22: (22, 21),
+    23: (23, 18),
+    24: (24, 23, 22, 17),
+    25: (25, 22),
+    26: (26, 6, 2, 1),
+    27: (27, 5, 2, 1),
+    28: (28, 25),
+    29: (29, 27),
+    30: (30, 6, 4, 1),
+    31: (31, 28),
+    32: (32, 22, 2, 1),
+}
+
+
+def lfsr_taps(width: int) -> Tuple[int, ...]:
+    """
+    Get the taps of a maximal length LFSR.
+
+    :param width: width of the LFSR in bits
+    :return: one-based tap positions
+    :raises ValueError: if no maximal length LFSR is known for this width
+    """
+    if width not in LFSR_TAPS:
+        raise ValueError(f"no maximal length LFSR is known for width {width}")
+    return LFSR_TAPS[width]
+
+
+def lfsr_next(state: Value) -> Value:
+    """
+    Calculate the next state of a maximal length LFSR.
+
+    The LFSR shifts towards the most significant bit, and cycles through all non-zero states. Therefore, the state
+    should be reset to a non-zero value, such as 1.
+
+    :param state: current state of the LFSR
+    :return: next state of the LFSR
+    """
+    feedback = xor_reduce(state[tap - 1] for tap in lfsr_taps(len(state)))
+    return Cat(feedback, state[:-1])
+
+
+def lfsr_terminal(width: int) -> int:
+    """
+    Get the last state of the LFSR sequence before it returns to 1.
+
+    Only the most significant bit is set in this state, and since that bit is always a tap, the feedback shifts in a
+    one while all other bits are shifted out.
+
+    :param width: width of the LFSR in bits
+    :return: state preceding the state 1
+    """
+    lfsr_taps(width)
+    return 1 << (width - 1)
@@ -13,7 +13,7 @@ def parity_check_matrix_to_systematic(input_parity_check_matrix: NDArray) -> Tup
     :return: systematic parity-check matrix, and a list of swapped columns
     :raises ValueError: if the input parity-check matrix contains a redundant row
     """
-    parity_check_matrix = np.array(input_parity_check_matrix, dtype=int)
+    parity_check_matrix = np.array(input_parity_check_matrix, dtype=np.uint8)
     rows, cols = parity_check_matrix.shape
     col_swaps = []
     row_swaps = list(range(rows))
@@ -24,7 +24,7 @@ def parity_check_matrix_to_systematic(input_parity_check_matrix: NDArray) -> Tup
             # First, try to find a row higher up to swap down
             for row in reversed(range(row_offset)):
                 if parity_check_matrix[row, col_offset] == 1:
-                    logging.debug(f"swapping rows {row_offset} {row}")
+                    logging.debug("swapping rows %d %d", row_offset, row)
                     parity_check_matrix[[row, row_offset], :] = parity_check_matrix[[row_offset, row], :]
                     row_swaps[row], row_swaps[row_offset] = row_swaps[row_offset], row_swaps[row]
                     break
@@ -33,7 +33,7 @@ def parity_check_matrix_to_systematic(input_parity_check_matrix: NDArray) -> Tup
                 for col in reversed(range(col_offset)):
                     if parity_check_matrix[row_offset, col] == 1:
                         col_swaps.append((col_offset, col))
-                        logging.debug(f"swapping columns {col_offset} {col}")
+                        logging.debug("swapping columns %d %d", col_offset, col)
                         parity_check_matrix[:, [col, col_offset]] = parity_check_matrix[:, [col_offset, col]]
                         break
                 else:
@@ -43,23 +43,32 @@ def parity_check_matrix_to_systematic(input_parity_check_matrix: NDArray) -> Tup
                         Row {row_swaps[row_offset]} in the original matrix is redundant."""
                     )
 
-        # Clear the column above this diagonal
-        for row in reversed(range(row_offset)):
-            if parity_check_matrix[row, col_offset] == 1:
-                logging.debug(f"summing rows {row_offset} -> {row}")
+        # Clear the rest of this column, both above and below the diagonal, by summing this row into all other rows
+        # with a one in this column. This row has no ones in the columns that were already cleared, so those stay
+        # cleared.
+        for row, value in enumerate(parity_check_matrix[:, col_offset].tolist()):
+            if value == 1 and row != row_offset:
+                logging.debug("summing rows %d -> %d", row_offset, row)
                 parity_check_matrix[row] ^= parity_check_matrix[row_offset]
 
-    # Clear the triangle below the diagonal
-    for col in range(rows):
-        for row in range(col + 1, rows):
-            if parity_check_matrix[row, -(rows - col)] == 1:
-                logging.debug(f"summing rows {col} -> {row}")
-                parity_check_matrix[row] ^= parity_check_matrix[col]
-
     # Return the new parity-check matrix, and a list of column swaps to apply to the generator matrix
     return parity_check_matrix, col_swaps
 
 
+def is_systematic(parity_check_matrix: NDArray) -> bool:
+    """
+    Check whether a binary parity-check matrix is in systematic form, that is, whether it ends in an identity matrix.
+
+    :param parity_check_matrix: input parity-check matrix
+    :return: True if the right side of the parity-check matrix is an identity matrix
+    """
+    parity_bits, length = parity_check_matrix.shape
+
+    # For a binary matrix, the block is an identity matrix when the only ones are on the diagonal
+    identity_block = parity_check_matrix[:, length - parity_bits:]
+    return np.trace(identity_block) == parity_bits and identity_block.sum() == parity_bits
+
+
 def generator_matrix_from_systematic(parity_check_matrix: NDArray) -> NDArray:
     """
     Create a systematic generator matrix from a systematic parity-check matrix.
@@ -73,13 +82,13 @@ def generator_matrix_from_systematic(parity_check_matrix: NDArray) -> NDArray:
 
     # Verify that the matrix is in systematic form by looking for an identity matrix on the right side of the
     # parity-check matrix
-    if not np.array_equal(parity_check_matrix[:, length-parity_bits:], np.identity(parity_bits)):
+    if not is_systematic(parity_check_matrix):
         raise ValueError("Check matrix is not in systematic form")
 
     # Get the parity part from the parity-check matrix
     parity_part = parity_check_matrix[:, 0:data_bits]
     # Create a new identity matrix
-    identity_part = np.identity(data_bits, dtype=int)
+    identity_part = np.identity(data_bits, dtype=parity_check_matrix.dtype)
     # Concatenate the matrices to create the generator matrix
     generator_matrix = np.hstack((identity_part, parity_part.T))
     return generator_matrix
@@ -93,19 +102,25 @@ def generator_matrix_from_parity_check_matrix(parity_check_matrix: NDArray) -> N
     is created. Finally, this systematic generator matrix is converted into a valid generator matrix for the original
     parity-check matrix by swapping columns.
 
-    This function uses ``parity_check_matrix_to_systematic`` and ``generator_matrix_from_systematic``.
+    This function uses ``parity_check_matrix_to_systematic`` and ``generator_matrix_from_systematic``. If the
+    parity-check matrix is already in systematic form, the conversion is skipped.
 
     :param parity_check_matrix: input parity-check matrix
     :return: matching generator matrix
     """
+    if is_systematic(parity_check_matrix):
+        return generator_matrix_from_systematic(parity_check_matrix)
+
     # Calculate the systematic parity-check and generator matrix
     parity_check_systematic, col_swaps = parity_check_matrix_to_systematic(parity_check_matrix)
     generator_systematic = generator_matrix_from_systematic(parity_check_systematic)
 
-    # Calculate the generator matrix for the original parity-check matrix
-    generator_matrix = np.array(generator_systematic, dtype=int)
+    # Calculate the generator matrix for the original parity-check matrix, by composing the column swaps into a
+    # single permutation that is applied at once. Indexing with the permutation already creates a new array.
+    permutation = np.arange(generator_systematic.shape[1])
     for (a, b) in col_swaps[::-1]:
-        generator_matrix[:, [b, a]] = generator_matrix[:, [a, b]]
+        permutation[[b, a]] = permutation[[a, b]]
+    generator_matrix = generator_systematic[:, permutation]
 
     # Assert that both matrices are compatible
     assert ((np.matmul(parity_check_matrix, generator_matrix.T) % 2) == 0).all()
@@ -120,8 +135,18 @@ def np_array_to_value(array: NDArray) -> int:
     :param array: numpy vector
     :return: value as int
     """
-    (size,) = array.shape
-    return sum(
-        (1 << i) if array[i] else 0
-        for i in range(size)
-    )
+    # Pack the bits with the first element as least significant bit, and read the bytes as a single integer
+    return int.from_bytes(np.packbits(array != 0, bitorder="little").tobytes(), "little")
+
+
+def nonzero_per_row(matrix: NDArray) -> List[List[int]]:
+    """
+    Determine the column indices of the non-zero elements in each row of a matrix.
+
+    :param matrix: input matrix
+    :return: list of column indices for each row
+    """
+    rows, cols = np.nonzero(matrix)
+    # The indices are sorted by row, so they can be split at the cumulative row counts
+    ends = np.cumsum(np.bincount(rows, minlength=matrix.shape[0]))
+    return [cols[end - count:end].tolist() for end, count in zip(ends, np.diff(ends, prepend=0))]
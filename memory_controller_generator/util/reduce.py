@@ -1,14 +1,74 @@
+import functools
+import itertools
 import operator
-from functools import reduce
-from typing import TypeVar, Iterable
+from typing import TypeVar, Iterable, Callable, List, Sequence
+
+import numpy as np
+from amaranth import Value, Cat
+
 T = TypeVar('T')
 
 
 def or_reduce(elements: Iterable[T]) -> T:
-    """Reduce a sequence using the or operator"""
-    return reduce(operator.or_, elements, 0)
+    """Reduce a sequence using a balanced tree of or operators"""
+    return _reduce(operator.or_, elements, 0, Value.any)
 
 
 def xor_reduce(elements: Iterable[T]) -> T:
-    """Reduce a sequence using the xor operator"""
-    return reduce(operator.xor, elements, 0)
+    """Reduce a sequence using a balanced tree of xor operators"""
+    return _reduce(operator.xor, elements, 0, Value.xor)
+
+
+def or_reduce_bits(indices: Iterable[int]) -> int:
+    """Create an integer with the specified distinct bit indices set, which is the or of their one-hot values"""
+    return sum(1 << i for i in indices)
+
+
+def or_reduce_bits_each(patterns: Iterable[Sequence[int]]) -> List[int]:
+    """Create the integer of ``or_reduce_bits`` for every pattern at once, using a single vectorized reduction"""
+    patterns = list(patterns)
+    lengths = np.fromiter(map(len, patterns), dtype=np.intp, count=len(patterns))
+    indices = np.fromiter(itertools.chain.from_iterable(patterns), dtype=np.intp, count=lengths.sum())
+    if len(indices) == 0:
+        return [0] * len(patterns)
+
+    # Fixed width integers are only used when every bit fits, otherwise fall back to Python integers
+    bits = np.left_shift(1, indices if indices.max() < 63 else indices.astype(object))
+
+    # Empty patterns are skipped in the reduction, as they would take a bit from the next pattern
+    masks = np.zeros(len(patterns), dtype=bits.dtype)
+    nonempty = lengths > 0
+    masks[nonempty] = np.bitwise_or.reduceat(bits, (np.cumsum(lengths) - lengths)[nonempty])
+    return masks.tolist()
+
+
+def tree_reduce(function: Callable[[T, T], T], elements: Iterable[T], initial: T) -> T:
+    """
+    Reduce a sequence using a balanced tree of function applications, instead of a linear chain. The depth of the
+    resulting expression is logarithmic in the number of elements. The initial value is only returned when the
+    sequence is empty.
+    """
+    elements = list(elements)
+    if not elements:
+        return initial
+
+    while len(elements) > 1:
+        reduced = [function(a, b) for a, b in zip(elements[0::2], elements[1::2])]
+        if len(elements) % 2:
+            reduced.append(elements[-1])
+        elements = reduced
+    return elements[0]
+
+
+def _reduce(function: Callable[[T, T], T], elements: Iterable[T], initial: T,
+            reduce_bits: Callable[[Value], Value]) -> T:
+    """
+    Reduce a sequence of integers directly, as the depth of the tree only matters for expressions. A sequence of
+    single bit values is concatenated and reduced by a single reduction operator, which the backend lowers to a tree.
+    """
+    elements = list(elements)
+    if all(isinstance(element, int) for element in elements):
+        return functools.reduce(function, elements, initial)
+    if elements and all(isinstance(element, Value) and len(element) == 1 for element in elements):
+        return reduce_bits(Cat(*elements))
+    return tree_reduce(function, elements, initial)
@@ -1,5 +1,6 @@
 import random
 import unittest
+from collections import deque
 
 from nmigen import *
 from nmigen.back import pysim
@@ -18,9 +19,10 @@ class BasicControllerTestTop(Elaboratable):
     request and response ports of the controller are exposed for the simulator to control.
     """
 
-    def __init__(self, code: GenericCode, addr_bits: int):
+    def __init__(self, code: GenericCode, addr_bits: int, **controller_kwargs):
         self.code = code
         self.addr_bits = addr_bits
+        self.controller_kwargs = controller_kwargs
 
         self.req = MemoryRequestRecord(addr_bits, code.data_bits)
         self.rsp = MemoryResponseRecord(code.data_bits)
@@ -28,7 +30,8 @@ class BasicControllerTestTop(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.controller = controller = BasicController(self.code, addr_width=self.addr_bits)
+        m.submodules.controller = controller = BasicController(self.code, addr_width=self.addr_bits,
+                                                               **self.controller_kwargs)
 
         # Create a memory for simulation
         mem = Memory(width=self.code.total_bits, depth=2 ** self.addr_bits, init=list(range(2 ** self.addr_bits)))
@@ -60,6 +63,27 @@ class TestBasicController(unittest.TestCase):
     """Simulation testcase to exercise the BasicController implementation"""
 
     def test_simulation(self):
+        self.simulate()
+
+    def test_simulation_pipeline(self):
+        self.simulate(max_outstanding=3, pipeline=True)
+
+    def test_simulation_skid_buffer(self):
+        self.simulate(max_outstanding=2, skid_buffer=True)
+
+    def test_simulation_pipeline_skid_buffer(self):
+        self.simulate(max_outstanding=4, pipeline=True, skid_buffer=True)
+
+    def test_simulation_registered_read(self):
+        self.simulate(max_outstanding=2, registered_read=True)
+
+    def test_simulation_pipeline_registered_read(self):
+        self.simulate(max_outstanding=4, pipeline=True, registered_read=True)
+
+    def test_simulation_skid_buffer_registered_read(self):
+        self.simulate(max_outstanding=3, skid_buffer=True, registered_read=True)
+
+    def simulate(self, max_outstanding: int = 1, **controller_kwargs):
         # Set the clock period and number of cycles
         clk_period = 1e-6
         clk_cycles = 1e3
@@ -69,7 +93,7 @@ class TestBasicController(unittest.TestCase):
         code.generate_matrices()
 
         # Setup the nMigen simulator
-        top = BasicControllerTestTop(code, addr_bits=4)
+        top = BasicControllerTestTop(code, addr_bits=4, **controller_kwargs)
         sim = pysim.Simulator(top)
         sim.add_clock(clk_period)
 
@@ -101,10 +125,8 @@ class TestBasicController(unittest.TestCase):
 
         # Process responsible for monitoring the interfaces and checking that the controller behaves
         def monitor():
-            outstanding_request = 0
+            outstanding_requests = deque()
             memory_mirror = list(range(16))
-            memory_previous = list(range(16))
-            last_request = (0, 0, 0)
 
             while True:
                 # Run one clock cycle
@@ -117,19 +139,11 @@ class TestBasicController(unittest.TestCase):
 
                 # If a response is accepted
                 if rsp_valid and rsp_ready:
-                    last_addr, last_write_en, _ = last_request
+                    expected = outstanding_requests.popleft()
                     data = (yield top.rsp.read_data)
 
-                    # If the last operation was a write, check the memory before the write operation
-                    if last_write_en:
-                        expected = memory_previous[last_addr]
-                        self.assertEqual(data, expected)
-                    # If the last operation was a read, check the current memory state
-                    else:
-                        expected = memory_mirror[last_addr]
-                        self.assertEqual(data, expected)
-
-                    outstanding_request -= 1
+                    # The response should contain the memory contents at the time the request was accepted
+                    self.assertEqual(data, expected)
 
                 # If a request is accepted
                 if req_valid and req_ready:
@@ -137,17 +151,15 @@ class TestBasicController(unittest.TestCase):
                     write_en = (yield top.req.write_en)
                     data = (yield top.req.write_data)
 
+                    # Save the expected response, which is the memory contents before a possible write operation
+                    outstanding_requests.append(memory_mirror[addr])
+
                     # If the operation is a write, update the mirror of the memory
                     if write_en:
-                        memory_previous[addr] = memory_mirror[addr]
                         memory_mirror[addr] = data
 
-                    # Save this request for use in response handling
-                    last_request = (addr, write_en, data)
-                    outstanding_request += 1
-
-                # Make sure that there are always 0 or 1 outstanding requests
-                self.assertIn(outstanding_request, (0, 1))
+                # Make sure that the number of outstanding requests never exceeds the controller latency
+                self.assertLessEqual(len(outstanding_requests), max_outstanding)
 
         # Add the processes to the simulator
         sim.add_sync_process(process_req)
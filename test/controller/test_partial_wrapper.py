@@ -0,0 +1,137 @@
+import random
+import unittest
+from collections import deque
+
+from nmigen.back import pysim
+
+from memory_controller_generator.controller.partial_wrapper import PartialWriteWrapper
+
+
+class TestPartialWriteWrapper(unittest.TestCase):
+    """Simulation testcase to exercise the PartialWriteWrapper implementation"""
+
+    def test_simulation(self):
+        accepted = self.simulate(write_probability=0.5, partial_probability=0.5, ready_probability=0.75)
+
+        # All kinds of requests should have been exercised
+        self.assertGreater(accepted.count("read"), 10)
+        self.assertGreater(accepted.count("write"), 10)
+        self.assertGreater(accepted.count("partial"), 10)
+
+    def test_simulation_full_writes(self):
+        accepted = self.simulate(write_probability=0.5, partial_probability=0, ready_probability=1)
+
+        # Without partial writes the wrapper should pass on a request every cycle
+        self.assertNotIn("partial", accepted)
+        self.assertNotIn(None, accepted)
+
+    def test_simulation_back_to_back_reads(self):
+        accepted = self.simulate(write_probability=0, partial_probability=0, ready_probability=1)
+
+        # Reads should be passed through without any bubbles
+        self.assertEqual(accepted, ["read"] * len(accepted))
+        self.assertEqual(len(accepted), 200)
+
+    def simulate(self, write_probability: float, partial_probability: float, ready_probability: float,
+                 clk_cycles: int = 200, addr_bits: int = 2, data_bits: int = 32):
+        """
+        Simulate the wrapper in front of a memory which responds to every request in order, one cycle later.
+
+        The response output is always ready, as the wrapper expects the response to its read to be the next one.
+
+        :return: kind of the request accepted in every cycle, or None if no request was accepted
+        """
+        # Set the clock period
+        clk_period = 1e-6
+
+        # Setup the nMigen simulator
+        dut = PartialWriteWrapper(addr_width=addr_bits, data_bits=data_bits)
+        sim = pysim.Simulator(dut)
+        sim.add_clock(clk_period)
+
+        # Seed the random generator to make the test deterministic
+        random.seed(0)
+
+        mask_bits = data_bits // 8
+        accepted = []
+
+        def process():
+            # Memory contents as seen through the wrapper and as stored in the memory behind it
+            memory = [random.randrange(2 ** data_bits) for _ in range(2 ** addr_bits)]
+            expected_memory = list(memory)
+            # Read data of the requests accepted by the memory, which are answered in order
+            memory_responses = deque()
+            # Expected read data of the accepted requests, or None for writes
+            outstanding_requests = deque()
+
+            yield dut.rsp_out.ready.eq(1)
+
+            request = None
+            for cycle in range(clk_cycles):
+                # Keep a request valid until it is accepted
+                if request is None:
+                    addr = random.randrange(2 ** addr_bits)
+                    data = random.randrange(2 ** data_bits)
+                    if random.random() >= write_probability:
+                        request = ("read", addr, 0, data, 0)
+                    elif random.random() >= partial_probability:
+                        request = ("write", addr, 1, data, 2 ** mask_bits - 1)
+                    else:
+                        request = ("partial", addr, 1, data, random.randrange(2 ** mask_bits - 1))
+                kind, addr, write_en, data, mask = request
+                yield dut.req_in.valid.eq(1)
+                yield dut.req_in.addr.eq(addr)
+                yield dut.req_in.write_en.eq(write_en)
+                yield dut.req_in.write_data.eq(data)
+                yield dut.req_in.write_mask.eq(mask)
+
+                # The memory answers the oldest request
+                yield dut.req_out.ready.eq(random.random() < ready_probability)
+                if memory_responses:
+                    yield dut.rsp_in.valid.eq(1)
+                    yield dut.rsp_in.read_data.eq(memory_responses[0])
+                else:
+                    yield dut.rsp_in.valid.eq(0)
+                yield pysim.Settle()
+
+                if memory_responses and (yield dut.rsp_in.ready):
+                    memory_responses.popleft()
+
+                # Only responses to the original requests should be passed on
+                if (yield dut.rsp_out.valid):
+                    expected = outstanding_requests.popleft()
+                    if expected is not None:
+                        self.assertEqual((yield dut.rsp_out.read_data), expected)
+
+                # The memory only ever sees full word operations
+                if (yield dut.req_out.valid) and (yield dut.req_out.ready):
+                    out_addr = (yield dut.req_out.addr)
+                    memory_responses.append(memory[out_addr])
+                    if (yield dut.req_out.write_en):
+                        memory[out_addr] = (yield dut.req_out.write_data)
+
+                if (yield dut.req_in.ready):
+                    # Merge the written bytes into the expected memory contents
+                    if write_en:
+                        outstanding_requests.append(None)
+                        for i in range(mask_bits):
+                            if mask & (1 << i):
+                                byte_mask = 0xff << (8 * i)
+                                expected_memory[addr] = (expected_memory[addr] & ~byte_mask) | (data & byte_mask)
+                    else:
+                        outstanding_requests.append(expected_memory[addr])
+                    accepted.append(kind)
+                    request = None
+                else:
+                    accepted.append(None)
+
+                yield
+
+        sim.add_sync_process(process)
+        sim.run()
+
+        return accepted
+
+
+if __name__ == "__main__":
+    unittest.main()
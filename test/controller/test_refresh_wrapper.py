@@ -0,0 +1,154 @@
+import random
+import unittest
+from collections import deque
+
+from nmigen.back import pysim
+
+from memory_controller_generator.controller.refresh_wrapper import RefreshWrapper
+
+
+class TestRefreshWrapper(unittest.TestCase):
+    """Simulation testcase to exercise the RefreshWrapper implementation"""
+
+    def test_simulation_burst(self):
+        burst_len = 3
+        refreshes, _ = self.simulate(req_probability=0.5, refresh_counter_width=4, burst_len=burst_len)
+
+        # Every refresh should be part of a burst of consecutive addresses, without any request in between
+        self.assertGreater(len(refreshes), burst_len)
+        for start in range(0, len(refreshes) - burst_len + 1, burst_len):
+            burst = refreshes[start:start + burst_len]
+            addresses = [addr for _, addr, _ in burst]
+            self.assertEqual(addresses, [(addresses[0] + i) % 16 for i in range(burst_len)])
+            self.assertEqual(burst[-1][2], burst[0][2])
+
+    def test_simulation_num_entries(self):
+        refreshes, _ = self.simulate(req_probability=0, refresh_counter_width=0, num_entries=5)
+
+        # The refresh address should wrap around after the last entry
+        addresses = [addr for _, addr, _ in refreshes]
+        self.assertEqual(addresses[:7], [0, 1, 2, 3, 4, 0, 1])
+        self.assertEqual(max(addresses), 4)
+
+    def test_invalid_num_entries(self):
+        for num_entries in (0, 17):
+            with self.assertRaises(ValueError):
+                RefreshWrapper(addr_width=4, data_bits=8, refresh_counter_width=0, num_entries=num_entries)
+
+    def test_simulation_force_refresh_delay(self):
+        delay = 5
+        forced, _ = self.simulate(req_probability=1, refresh_counter_width=4, force_refresh=True)
+        delayed, _ = self.simulate(req_probability=1, refresh_counter_width=4, force_refresh=True,
+                                   force_refresh_delay=delay)
+
+        # With a request always valid, the refresh should only be forced after waiting for the full delay
+        self.assertTrue(forced)
+        self.assertEqual(len(delayed), len(forced))
+        for (forced_cycle, _, _), (delayed_cycle, _, _) in zip(forced, delayed):
+            self.assertEqual(delayed_cycle, forced_cycle + delay)
+
+    def test_invalid_force_refresh_delay(self):
+        with self.assertRaises(ValueError):
+            RefreshWrapper(addr_width=4, data_bits=8, refresh_counter_width=0, force_refresh_delay=5)
+
+    def test_simulation_refresh_period(self):
+        # Widths with known taps use an LFSR which rolls over every 2 ** width - 1 cycles, the others a binary counter
+        # which rolls over every 2 ** width cycles. A zero width counter refreshes as often as possible, which is
+        # every other cycle with this memory.
+        for refresh_counter_width, period in ((0, 2), (1, 2), (4, 15), (5, 31)):
+            with self.subTest(refresh_counter_width=refresh_counter_width):
+                refreshes, _ = self.simulate(req_probability=0, clk_cycles=300,
+                                             refresh_counter_width=refresh_counter_width)
+                cycles = [cycle for cycle, _, _ in refreshes]
+                self.assertGreater(len(cycles), 2)
+                self.assertEqual({b - a for a, b in zip(cycles, cycles[1:])}, {period})
+
+    def simulate(self, req_probability: float, clk_cycles: int = 200, addr_bits: int = 4, **wrapper_kwargs):
+        """
+        Simulate the wrapper in front of a memory which responds to every request in order, one cycle later.
+
+        :return: list of refreshes as (cycle, address, requests accepted so far), and the cycles where a request was
+                 accepted
+        """
+        # Set the clock period
+        clk_period = 1e-6
+
+        # Setup the nMigen simulator
+        dut = RefreshWrapper(addr_width=addr_bits, data_bits=8, **wrapper_kwargs)
+        sim = pysim.Simulator(dut)
+        sim.add_clock(clk_period)
+
+        # Seed the random generator to make the test deterministic
+        random.seed(0)
+
+        burst_len = wrapper_kwargs.get("burst_len", 1)
+        refreshes = []
+        accepted = []
+
+        def process():
+            # Requests sent to the memory as (is refresh, address), which are answered in order
+            memory_requests = deque()
+            # Addresses of the accepted requests which still expect a response
+            outstanding_requests = deque()
+            # Refresh burst in progress as the number of refreshes sent
+            burst_sent = 0
+
+            yield dut.req_out.ready.eq(1)
+            yield dut.rsp_out.ready.eq(1)
+
+            request_valid = False
+            for cycle in range(clk_cycles):
+                # Keep a request valid until it is accepted
+                if not request_valid and random.random() < req_probability:
+                    request_valid = True
+                    yield dut.req_in.addr.eq(random.randrange(2 ** addr_bits))
+                yield dut.req_in.valid.eq(request_valid)
+
+                # The memory answers the oldest request
+                if memory_requests:
+                    yield dut.rsp_in.valid.eq(1)
+                    yield dut.rsp_in.read_data.eq(memory_requests[0][1])
+                else:
+                    yield dut.rsp_in.valid.eq(0)
+                yield pysim.Settle()
+
+                # Responses of refreshes should be swallowed, all others passed on
+                if memory_requests and (yield dut.rsp_in.ready):
+                    is_refresh, addr = memory_requests.popleft()
+                    if is_refresh:
+                        self.assertFalse((yield dut.rsp_out.valid))
+                    else:
+                        self.assertTrue((yield dut.rsp_out.valid))
+                        self.assertEqual((yield dut.rsp_out.read_data), outstanding_requests.popleft())
+                else:
+                    self.assertFalse((yield dut.rsp_out.valid))
+
+                # Incomming requests should be blocked for the rest of a burst
+                if 0 < burst_sent < burst_len:
+                    self.assertFalse((yield dut.req_in.ready))
+
+                if (yield dut.req_out.valid):
+                    addr = (yield dut.req_out.addr)
+                    is_refresh = bool((yield dut.req_out.debug_ignore))
+                    memory_requests.append((is_refresh, addr))
+                    if is_refresh:
+                        refreshes.append((cycle, addr, len(accepted)))
+                        burst_sent = burst_sent % burst_len + 1
+                    else:
+                        # Only the accepted request is passed on
+                        self.assertTrue(request_valid and (yield dut.req_in.ready))
+                        self.assertEqual(addr, (yield dut.req_in.addr))
+                        outstanding_requests.append(addr)
+                        accepted.append(cycle)
+                        request_valid = False
+
+                yield
+
+        sim.add_sync_process(process)
+        sim.run()
+
+        return refreshes, accepted
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import random
 import unittest
+from collections import deque
 
 from nmigen import *
 from nmigen.back import pysim
@@ -18,9 +19,10 @@ class WriteBackControllerTestTop(Elaboratable):
     request and response ports of the controller are exposed for the simulator to control.
     """
 
-    def __init__(self, code: GenericCode, addr_bits: int):
+    def __init__(self, code: GenericCode, addr_bits: int, **controller_kwargs):
         self.code = code
         self.addr_bits = addr_bits
+        self.controller_kwargs = controller_kwargs
 
         self.req = MemoryRequestRecord(addr_bits, code.data_bits)
         self.rsp = MemoryResponseRecord(code.data_bits)
@@ -34,7 +36,8 @@ class WriteBackControllerTestTop(Elaboratable):
     def elaborate(self, platform):
         m = Module()
 
-        m.submodules.controller = controller = WriteBackController(self.code, addr_width=self.addr_bits)
+        m.submodules.controller = controller = WriteBackController(self.code, addr_width=self.addr_bits,
+                                                                   **self.controller_kwargs)
 
         # Create a memory for simulation
         self.mem = mem = Memory(width=self.code.total_bits, depth=2 ** self.addr_bits, init=list(0 for _ in range(2 ** self.addr_bits)))
@@ -53,6 +56,16 @@ class WriteBackControllerTestTop(Elaboratable):
             write_port.data.eq(controller.sram.write_data),
         ]
 
+        # Hook up the second write port when the controller uses it for write-back operations
+        if controller.sram.dual_write:
+            wb_write_port = mem.write_port()
+            m.submodules += wb_write_port
+            m.d.comb += [
+                wb_write_port.addr.eq(controller.sram.wb_addr),
+                wb_write_port.en.eq(controller.sram.wb_write_en),
+                wb_write_port.data.eq(controller.sram.wb_write_data),
+            ]
+
         m.d.comb += [
             self.sram.addr.eq(controller.sram.addr),
             self.sram.clk_en.eq(controller.sram.clk_en),
@@ -77,16 +90,49 @@ class TestBasicController(unittest.TestCase):
     """Simulation testcase to exercise the BasicController implementation"""
 
     def test_simulation(self):
-        # Set the clock period and number of cycles
+        self.simulate()
+
+    def test_simulation_pipeline(self):
+        self.simulate(max_outstanding=3, pipeline=True)
+
+    # A write-back colliding with a write to the same address is rare, so these tests run for more cycles
+    def test_simulation_dual_write(self):
+        self.simulate(clk_cycles=1e4, dual_write=True)
+
+    def test_simulation_pipeline_dual_write(self):
+        self.simulate(max_outstanding=3, clk_cycles=1e4, pipeline=True, dual_write=True)
+
+    def test_simulation_registered_writeback(self):
+        self.simulate(registered_writeback=True)
+
+    def test_simulation_pipeline_registered_writeback(self):
+        self.simulate(max_outstanding=3, pipeline=True, registered_writeback=True)
+
+    def test_simulation_pipeline_dual_write_registered_writeback(self):
+        self.simulate(max_outstanding=3, clk_cycles=1e4, pipeline=True, dual_write=True, registered_writeback=True)
+
+    def test_simulation_registered_read(self):
+        self.simulate(max_outstanding=2, registered_read=True)
+
+    def test_simulation_pipeline_registered_read(self):
+        self.simulate(max_outstanding=4, pipeline=True, registered_read=True)
+
+    def test_simulation_dual_write_registered_read(self):
+        self.simulate(max_outstanding=2, clk_cycles=1e4, dual_write=True, registered_read=True)
+
+    def test_simulation_registered_writeback_registered_read(self):
+        self.simulate(max_outstanding=2, registered_writeback=True, registered_read=True)
+
+    def simulate(self, max_outstanding: int = 1, clk_cycles: float = 1e3, **controller_kwargs):
+        # Set the clock period
         clk_period = 1e-6
-        clk_cycles = 1e3
 
         # Setup the error correction code used in this test
         code = ExtendedHammingCode(data_bits=32)
         code.generate_matrices()
 
         # Setup the nMigen simulator
-        top = WriteBackControllerTestTop(code, addr_bits=4)
+        top = WriteBackControllerTestTop(code, addr_bits=4, **controller_kwargs)
         sim = pysim.Simulator(top)
         sim.add_clock(clk_period)
 
@@ -131,10 +177,8 @@ class TestBasicController(unittest.TestCase):
 
         # Process responsible for monitoring the interfaces and checking that the controller behaves
         def monitor():
-            outstanding_request = 0
+            outstanding_requests = deque()
             memory_mirror = list(0 for _ in range(16))
-            memory_previous = list(0 for _ in range(16))
-            last_request = (0, 0, 0)
 
             while True:
                 # Run one clock cycle
@@ -147,25 +191,14 @@ class TestBasicController(unittest.TestCase):
 
                 # If a response is accepted
                 if rsp_valid and rsp_ready:
-                    last_addr, last_write_en, _ = last_request
+                    expected = outstanding_requests.popleft()
                     data = (yield top.rsp.read_data)
                     error = (yield top.rsp.error)
                     uncorrectable_error = (yield top.rsp.uncorrectable_error)
 
-                    # If the last operation was a write, check the memory before the write operation
-                    if last_write_en:
-                        expected = memory_previous[last_addr]
-                        if not uncorrectable_error:
-                            # print(f"{last_addr} {data:x} {expected:x}")
-                            self.assertEqual(data, expected)
-                    # If the last operation was a read, check the current memory state
-                    else:
-                        expected = memory_mirror[last_addr]
-                        if not uncorrectable_error:
-                            # print(f"{last_addr} {data:x} {expected:x}")
-                            self.assertEqual(data, expected)
-
-                    outstanding_request -= 1
+                    # The response should contain the memory contents at the time the request was accepted
+                    if not uncorrectable_error:
+                        self.assertEqual(data, expected)
 
                 # If a request is accepted
                 if req_valid and req_ready:
@@ -173,17 +206,15 @@ class TestBasicController(unittest.TestCase):
                     write_en = (yield top.req.write_en)
                     data = (yield top.req.write_data)
 
+                    # Save the expected response, which is the memory contents before a possible write operation
+                    outstanding_requests.append(memory_mirror[addr])
+
                     # If the operation is a write, update the mirror of the memory
                     if write_en:
-                        memory_previous[addr] = memory_mirror[addr]
                         memory_mirror[addr] = data
 
-                    # Save this request for use in response handling
-                    last_request = (addr, write_en, data)
-                    outstanding_request += 1
-
-                # Make sure that there are always 0 or 1 outstanding requests
-                self.assertIn(outstanding_request, (0, 1))
+                # Make sure that the number of outstanding requests never exceeds the controller latency
+                self.assertLessEqual(len(outstanding_requests), max_outstanding)
 
         # Add the processes to the simulator
         sim.add_sync_process(process_req)
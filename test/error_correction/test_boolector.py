@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from memory_controller_generator.error_correction import SheLiCode, GenericCode
+
+
+class TestBoolectorCode(unittest.TestCase):
+    """Testcase to exercise the matrix generation of the BoolectorCode framework"""
+
+    def test_portfolio_after_serial(self):
+        # A code that already held a Boolector instance should still be usable by a portfolio
+        code = SheLiCode(data_bits=8)
+        code.generate_matrices(timeout=5.0)
+        self.check_matrices(code)
+
+        code.workers = 2
+        code.generate_matrices(timeout=5.0)
+        self.check_matrices(code)
+
+    def test_portfolio_twice(self):
+        code = SheLiCode(data_bits=8, workers=2)
+        code.generate_matrices(timeout=5.0)
+        self.check_matrices(code)
+
+        code.generate_matrices(timeout=5.0)
+        self.check_matrices(code)
+
+    def check_matrices(self, code: GenericCode):
+        self.assertEqual(code.parity_check_matrix.shape, (code.parity_bits, code.total_bits))
+        self.assertEqual(code.generator_matrix.shape, (code.data_bits, code.total_bits))
+        # Every codeword of the generator matrix should have a zero syndrome
+        self.assertFalse(np.any((code.generator_matrix.astype(int) @ code.parity_check_matrix.T) % 2))
+
+
+if __name__ == "__main__":
+    unittest.main()